@@ -0,0 +1,145 @@
+"""
+Prompt and parser assets for the LLM agents, loaded once per process.
+
+Importing LangChain and the Gemini client takes about a second (most of it
+google.generativeai), which every service, CLI and `import controller` used
+to pay up front. The agents now reach the LLM stack only through `llm()`,
+which imports it on first use, and take their prompt texts, prompt
+templates, output parsers and chat models from the caches here instead of
+rebuilding them per request.
+
+`preload()` pays the whole cost at once: it imports the stack and runs the
+warm-up hooks the agents registered, so a service can do it before serving
+its first request or before forking workers (see common/prefork.py).
+"""
+
+import functools
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+from common.structured_logging import get_logger
+
+logger = get_logger("assets")
+
+_llm = None
+_llm_lock = threading.Lock()
+_models = {}
+_models_lock = threading.Lock()
+_preload_hooks = []
+
+
+def llm() -> SimpleNamespace:
+    """LangChain/Gemini classes, imported on first use."""
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            started = time.perf_counter()
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            from langchain.prompts import ChatPromptTemplate
+            from langchain.output_parsers import StructuredOutputParser, ResponseSchema
+            _llm = SimpleNamespace(
+                ChatGoogleGenerativeAI=ChatGoogleGenerativeAI,
+                ChatPromptTemplate=ChatPromptTemplate,
+                StructuredOutputParser=StructuredOutputParser,
+                ResponseSchema=ResponseSchema,
+            )
+            logger.info("LLM stack imported", seconds=round(time.perf_counter() - started, 3))
+        return _llm
+
+
+@functools.lru_cache(maxsize=None)
+def prompt_text(path: str) -> str:
+    """Contents of a prompt file, read once."""
+    with open(path, "r") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=None)
+def prompt_template(*messages):
+    """ChatPromptTemplate for (role, template) message pairs, built once per distinct prompt."""
+    return llm().ChatPromptTemplate.from_messages(list(messages))
+
+
+@functools.lru_cache(maxsize=None)
+def structured_output_parser(schemas: tuple):
+    """StructuredOutputParser for a tuple of (name, description) response schemas, built once."""
+    stack = llm()
+    return stack.StructuredOutputParser.from_response_schemas(
+        [stack.ResponseSchema(name=name, description=description) for name, description in schemas]
+    )
+
+
+def chat_model(model: str, temperature: float):
+    """Gemini chat model for a model name and temperature, created once and shared across calls."""
+    api_key = os.getenv("GOOGLE_API_KEY")
+    key = (model, temperature, api_key)
+    with _models_lock:
+        if key not in _models:
+            chat_class = llm().ChatGoogleGenerativeAI
+            options = {}
+            fields = getattr(chat_class, "model_fields", None) or getattr(chat_class, "__fields__", {})
+            if "max_retries" in fields:
+                # One attempt: 429 backoff belongs to the LLM scheduler, which adapts its rate to it.
+                # langchain_google_genai 0.0.6 has no such option and retries quota errors itself.
+                options["max_retries"] = 1
+            _models[key] = chat_class(
+                model=model,
+                temperature=temperature,
+                convert_system_message_to_human=True,
+                google_api_key=api_key,
+                **options
+            )
+        return _models[key]
+
+
+def register_preload(hook):
+    """Register a no-argument function that builds an agent's assets during preload()."""
+    _preload_hooks.append(hook)
+    return hook
+
+
+def preload(models: bool = True) -> dict:
+    """
+    Import the LLM stack and build every registered asset now instead of on first use.
+
+    With `models`, the Gemini clients for every routed tier are created too;
+    that needs GOOGLE_API_KEY, and a failure there is logged rather than raised.
+
+    Returns:
+        dict: Seconds spent importing, building assets and creating models
+    """
+    timings = {}
+    started = time.perf_counter()
+    llm()
+    timings["import"] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    for hook in list(_preload_hooks):
+        hook()
+    timings["assets"] = round(time.perf_counter() - started, 3)
+
+    if models:
+        from common.model_router import TIER_MODELS, TIER_TEMPERATURE
+        started = time.perf_counter()
+        try:
+            for model in dict.fromkeys(TIER_MODELS.values()):
+                chat_model(model, TIER_TEMPERATURE)
+        except Exception as e:
+            logger.warning("Could not create chat models during preload", error=str(e))
+        timings["models"] = round(time.perf_counter() - started, 3)
+
+    logger.info("Assets preloaded", hooks=len(_preload_hooks), **timings)
+    return timings
+
+
+def asset_metrics() -> dict:
+    """Which assets are loaded in this process."""
+    return {
+        "llm_imported": _llm is not None,
+        "prompt_files": prompt_text.cache_info().currsize,
+        "prompt_templates": prompt_template.cache_info().currsize,
+        "output_parsers": structured_output_parser.cache_info().currsize,
+        "chat_models": len(_models),
+    }
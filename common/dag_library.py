@@ -0,0 +1,355 @@
+import ast
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from datetime import datetime
+
+from common.structured_logging import get_logger
+
+logger = get_logger("dag_library")
+
+# Similarity for the closest-match fallback used only when the generator LLM is unavailable
+DEGRADED_REUSE_THRESHOLD = float(os.getenv("DAG_DEGRADED_REUSE_THRESHOLD", "0.8"))
+# Neighbours below this similarity are not worth showing as examples
+MIN_EXAMPLE_SIMILARITY = 0.3
+MAX_EXAMPLE_CHARS = 3000
+
+DAG_ID_PATTERN = re.compile(r"dag_id\s*=\s*['\"]([^'\"]+)['\"]")
+
+
+def _words(value) -> list:
+    return [word for word in re.split(r"[^a-z0-9]+", str(value).lower()) if word]
+
+
+def _is_null(value) -> bool:
+    return value is None or str(value).strip().lower() in ("", "null", "none")
+
+
+def spec_tokens(pipeline_spec: dict) -> list:
+    """
+    Canonicalize a spec into structural tokens.
+
+    Source/destination types, incremental mode and transformation steps define
+    the shape of the DAG. Endpoints, paths and filters are parameters that get
+    substituted on reuse, so only whether they are set is tokenized.
+    """
+    source = pipeline_spec.get("source") or {}
+    destination = pipeline_spec.get("destination") or {}
+    transformations = pipeline_spec.get("transformations") or []
+    if not isinstance(source, dict):
+        source = {}
+    if not isinstance(destination, dict):
+        destination = {}
+    if not isinstance(transformations, list):
+        transformations = []
+
+    tokens = [
+        f"source:{str(source.get('type', '')).lower()}",
+        f"destination:{str(destination.get('type', '')).lower()}",
+        f"filter:{'none' if _is_null(source.get('query_or_filter')) else 'set'}",
+        f"transformations:{len(transformations)}",
+    ]
+
+    incremental = source.get("incremental")
+    if isinstance(incremental, dict):
+        tokens.append(f"incremental:{str(incremental.get('mode', '')).lower()}")
+
+    for step in transformations:
+        if not isinstance(step, dict):
+            continue
+        tokens.append(f"language:{str(step.get('language', '')).lower()}")
+        tokens.extend(f"operation:{word}" for word in _words(step.get("operation", "")))
+        tokens.extend(f"target:{word}" for word in _words(step.get("target", "")))
+
+    return tokens
+
+
+def structural_key(pipeline_spec: dict) -> str:
+    """
+    Hash of everything that fixes the DAG's code apart from spec_params: source
+    and destination types, incremental settings, whether a filter is set and
+    the ordered transformation steps. Only specs with equal keys can share a DAG.
+    """
+    source = pipeline_spec.get("source") or {}
+    destination = pipeline_spec.get("destination") or {}
+    transformations = pipeline_spec.get("transformations") or []
+    if not isinstance(source, dict):
+        source = {}
+    if not isinstance(destination, dict):
+        destination = {}
+    if not isinstance(transformations, list):
+        transformations = []
+
+    incremental = source.get("incremental")
+    structure = {
+        "source": " ".join(_words(source.get("type", ""))),
+        "destination": " ".join(_words(destination.get("type", ""))),
+        "filter": not _is_null(source.get("query_or_filter")),
+        "incremental": {key: " ".join(_words(value)) for key, value in sorted(incremental.items())}
+        if isinstance(incremental, dict) else None,
+        "transformations": [
+            [" ".join(_words(step.get(field, ""))) for field in ("language", "operation", "target")]
+            if isinstance(step, dict) else " ".join(_words(step))
+            for step in transformations
+        ],
+    }
+    return hashlib.sha256(json.dumps(structure, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def spec_params(pipeline_spec: dict) -> dict:
+    """Values that differ between structurally identical specs and are substituted on reuse."""
+    source = pipeline_spec.get("source") or {}
+    destination = pipeline_spec.get("destination") or {}
+    params = {
+        "endpoint_or_table": source.get("endpoint_or_table") if isinstance(source, dict) else None,
+        "query_or_filter": source.get("query_or_filter") if isinstance(source, dict) else None,
+        "destination_path": destination.get("path") if isinstance(destination, dict) else None,
+    }
+    return {key: None if _is_null(value) else str(value) for key, value in params.items()}
+
+
+def compact_code(dag_code: str) -> str:
+    """Drop comment-only and blank lines and cap length, for use as a few-shot example."""
+    lines = [line for line in dag_code.splitlines() if line.strip() and not line.strip().startswith("#")]
+    code = "\n".join(lines)
+    return code if len(code) <= MAX_EXAMPLE_CHARS else code[:MAX_EXAMPLE_CHARS] + "\n# ... (truncated)"
+
+
+class DAGLibrary:
+    """
+    Local similarity index of approved spec -> DAG pairs.
+
+    A spec with exactly the structure of an approved one (see structural_key)
+    reuses the stored DAG with its parameters substituted. Otherwise specs are
+    compared by TF-IDF cosine similarity over their structural tokens and get
+    their closest approved neighbours as few-shot examples.
+    """
+
+    def __init__(self, library_path: str = None):
+        self.library_path = library_path or os.getenv(
+            "DAG_LIBRARY_PATH",
+            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pipeline_generator_agent", "library", "approved.jsonl")
+        )
+        self._lock = threading.Lock()
+        self._entries = []
+        self._document_frequency = Counter()
+        self._vectors = None
+        self._reused = {}  # hash of reused DAG code -> how it was reused
+        self._ids = set()
+        self._offset = 0  # bytes of the library file already indexed
+        with self._lock:
+            self._refresh()
+
+    def add(self, pipeline_spec: dict, dag_code: str, judge_score: float = None):
+        """Record an approved (judged, validated and deployed) spec -> DAG pair."""
+        spec = {key: value for key, value in pipeline_spec.items() if key != "feedback"}
+        dag_id_match = DAG_ID_PATTERN.search(dag_code)
+        entry = {
+            "id": hashlib.sha256(dag_code.encode()).hexdigest()[:16],
+            "spec": spec,
+            "dag_code": dag_code,
+            "dag_id": dag_id_match.group(1) if dag_id_match else None,
+            "judge_score": judge_score,
+            "added_at": datetime.now().isoformat(),
+        }
+        with self._lock:
+            self._refresh()
+            if entry["id"] in self._ids:
+                return
+            os.makedirs(os.path.dirname(self.library_path), exist_ok=True)
+            with open(self.library_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._refresh()
+
+    def search(self, pipeline_spec: dict, k: int = 3) -> list:
+        """Return up to k (similarity, entry) pairs, most similar first."""
+        query = Counter(spec_tokens(pipeline_spec))
+        with self._lock:
+            self._refresh()
+            if not self._entries:
+                return []
+            if self._vectors is None:
+                self._vectors = [self._tfidf(Counter(entry["tokens"])) for entry in self._entries]
+            query_vector = self._tfidf(query)
+            scored = [
+                (self._cosine(query_vector, vector), entry)
+                for vector, entry in zip(self._vectors, self._entries)
+            ]
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return scored[:k]
+
+    def reuse(self, pipeline_spec: dict, degraded: bool = False):
+        """
+        Return an approved DAG adapted to this spec, or None.
+
+        Reuse needs an approved spec with the same structural_key whose changed
+        parameters can all be substituted in the stored code. With `degraded`
+        (the generator LLM is unavailable) the closest match above
+        DEGRADED_REUSE_THRESHOLD is returned instead when there is no exact one;
+        reuse_info() marks such a DAG as a fallback that must not pass.
+        """
+        key = structural_key(pipeline_spec)
+        with self._lock:
+            self._refresh()
+            exact = [entry for entry in reversed(self._entries) if entry["structure"] == key]
+        for entry in exact:
+            dag_code = self._substitute(entry, pipeline_spec)
+            if dag_code is not None:
+                return self._record_reuse(dag_code, entry, similarity=1.0, fallback=False)
+
+        if degraded:
+            matches = self.search(pipeline_spec, k=1)
+            if matches and matches[0][0] >= DEGRADED_REUSE_THRESHOLD:
+                similarity, entry = matches[0]
+                dag_code = self._substitute(entry, pipeline_spec)
+                if dag_code is not None:
+                    return self._record_reuse(dag_code, entry, similarity=similarity, fallback=True)
+        return None
+
+    def reuse_info(self, dag_code: str):
+        """
+        How a DAG returned by reuse() was produced, or None if it wasn't reused.
+
+        Returns:
+            dict: source_id, similarity, the stored judge_score and `fallback`
+                (True for a closest-match DAG served while the generator was unavailable)
+        """
+        with self._lock:
+            info = self._reused.get(hashlib.sha256(dag_code.encode()).hexdigest())
+        return dict(info) if info else None
+
+    def few_shot_examples(self, pipeline_spec: dict, k: int = 2) -> str:
+        """Compact text of the top-k approved neighbours, or "" if none are similar enough."""
+        examples = []
+        for similarity, entry in self.search(pipeline_spec, k=k):
+            if similarity < MIN_EXAMPLE_SIMILARITY:
+                continue
+            spec = {key: value for key, value in entry["spec"].items() if key not in ("user_request", "confidence")}
+            examples.append(
+                f"Specification (similarity {similarity:.2f}): {json.dumps(spec, separators=(',', ':'))}\n"
+                f"Approved DAG:\n{compact_code(entry['dag_code'])}"
+            )
+        return "\n\n".join(examples)
+
+    def mark_reused(self, dag_code: str, info: dict):
+        """Record reuse_info() for a DAG reused elsewhere, e.g. by a remote generator service."""
+        with self._lock:
+            self._reused[hashlib.sha256(dag_code.encode()).hexdigest()] = dict(info)
+
+    def _record_reuse(self, dag_code: str, entry: dict, similarity: float, fallback: bool) -> str:
+        self.mark_reused(dag_code, {
+            "source_id": entry["id"],
+            "similarity": round(similarity, 3),
+            "judge_score": entry.get("judge_score"),
+            "fallback": fallback,
+        })
+        logger.info("Reusing approved DAG", dag_id=entry['dag_id'] or entry['id'],
+                    similarity=round(similarity, 3), fallback=fallback)
+        return dag_code
+
+    def _substitute(self, entry: dict, pipeline_spec: dict):
+        """Swap the stored spec's parameter values for the new ones; None if that isn't safe."""
+        dag_code = entry["dag_code"]
+        old_params = spec_params(entry["spec"])
+        new_params = spec_params(pipeline_spec)
+
+        replacements = {}
+        for key, old_value in old_params.items():
+            new_value = new_params[key]
+            if old_value == new_value:
+                continue
+            # A parameter that is added, removed or too generic can't be swapped safely
+            if old_value is None or new_value is None or len(old_value) < 3:
+                return None
+            replacements[old_value] = new_value
+
+        if replacements:
+            # One pass over the code, matching whole values only ('sales' must not hit 'daily_sales')
+            pattern = re.compile(
+                "|".join(
+                    rf"(?<![A-Za-z0-9_]){re.escape(value)}(?![A-Za-z0-9_])"
+                    for value in sorted(replacements, key=len, reverse=True)
+                )
+            )
+            found = set(pattern.findall(dag_code))
+            if found != set(replacements):
+                return None
+            dag_code = pattern.sub(lambda match: replacements[match.group(0)], dag_code)
+
+        # Give the reused DAG its own id so it doesn't overwrite the original deployment
+        if entry.get("dag_id") and old_params != new_params:
+            suffix = hashlib.sha256(json.dumps(new_params, sort_keys=True).encode()).hexdigest()[:8]
+            dag_code = re.sub(
+                rf"(?<![A-Za-z0-9]){re.escape(entry['dag_id'])}(?![A-Za-z0-9])",
+                f"{entry['dag_id']}_{suffix}",
+                dag_code,
+            )
+
+        try:
+            ast.parse(dag_code)
+        except SyntaxError:
+            return None
+        return dag_code
+
+    def _index(self, entry: dict):
+        entry["tokens"] = spec_tokens(entry["spec"])
+        entry["structure"] = structural_key(entry["spec"])
+        self._ids.add(entry["id"])
+        self._entries.append(entry)
+        self._document_frequency.update(set(entry["tokens"]))
+        self._vectors = None
+
+    def _tfidf(self, counts: Counter) -> dict:
+        total = len(self._entries)
+        return {
+            token: count * (math.log((1 + total) / (1 + self._document_frequency[token])) + 1)
+            for token, count in counts.items()
+        }
+
+    @staticmethod
+    def _cosine(a: dict, b: dict) -> float:
+        dot = sum(weight * b.get(token, 0.0) for token, weight in a.items())
+        norm = math.sqrt(sum(w * w for w in a.values())) * math.sqrt(sum(w * w for w in b.values()))
+        return dot / norm if norm else 0.0
+
+    def _refresh(self):
+        """
+        Index entries appended to the library file since the last look (caller holds the lock).
+
+        Other processes sharing the file (the controller, generator service
+        replicas) add approved DAGs too; this picks them up without a restart.
+        """
+        try:
+            if os.path.getsize(self.library_path) <= self._offset:
+                return
+        except OSError:
+            return
+        with open(self.library_path, "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # still being written
+                self._offset += len(line)
+                try:
+                    entry = json.loads(line)
+                    if entry["id"] not in self._ids:
+                        self._index(entry)
+                except (json.JSONDecodeError, KeyError):
+                    continue
+
+
+_library = None
+_library_lock = threading.Lock()
+
+
+def get_library() -> DAGLibrary:
+    """Process-wide approved DAG library."""
+    global _library
+    with _library_lock:
+        if _library is None:
+            _library = DAGLibrary()
+        return _library
@@ -0,0 +1,274 @@
+"""
+Persistent, queryable history of flows, generation attempts and validations.
+
+Records are queued and written to SQLite by a single background thread, so
+the request path only pays for a queue put. Reads open their own connection
+(WAL mode lets them run alongside the writer). The database can also be
+queried directly, e.g.:
+
+    sqlite3 logs/history.db "SELECT status, COUNT(*) FROM flows GROUP BY status"
+"""
+
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+
+from common.structured_logging import get_logger
+
+logger = get_logger("history")
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS flows (
+    flow_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    request_hash TEXT NOT NULL,
+    request TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    dag_id TEXT,
+    spec_hash TEXT,
+    source_type TEXT,
+    spec_shape TEXT,
+    attempts INTEGER,
+    judge_score REAL,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS idx_flows_dag_id ON flows (dag_id);
+CREATE INDEX IF NOT EXISTS idx_flows_request_hash ON flows (request_hash);
+CREATE INDEX IF NOT EXISTS idx_flows_status_created ON flows (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_flows_created ON flows (created_at);
+CREATE INDEX IF NOT EXISTS idx_flows_source_status ON flows (source_type, status);
+CREATE INDEX IF NOT EXISTS idx_flows_shape_attempts ON flows (spec_shape, attempts);
+
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    flow_id TEXT,
+    created_at TEXT NOT NULL,
+    attempt INTEGER NOT NULL,
+    dag_id TEXT,
+    spec_hash TEXT,
+    judge_score REAL,
+    passed INTEGER,
+    reused INTEGER,
+    issues TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_attempts_flow ON attempts (flow_id);
+CREATE INDEX IF NOT EXISTS idx_attempts_dag_id ON attempts (dag_id);
+CREATE INDEX IF NOT EXISTS idx_attempts_created ON attempts (created_at);
+
+CREATE TABLE IF NOT EXISTS validations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    flow_id TEXT,
+    created_at TEXT NOT NULL,
+    dag_id TEXT,
+    filename TEXT,
+    success INTEGER NOT NULL,
+    errors TEXT,
+    warnings TEXT,
+    parse_time REAL
+);
+CREATE INDEX IF NOT EXISTS idx_validations_flow ON validations (flow_id);
+CREATE INDEX IF NOT EXISTS idx_validations_dag_id ON validations (dag_id);
+CREATE INDEX IF NOT EXISTS idx_validations_success_created ON validations (success, created_at);
+"""
+
+FLOW_COLUMNS = (
+    "flow_id", "created_at", "request_hash", "request", "status", "error", "dag_id",
+    "spec_hash", "source_type", "spec_shape", "attempts", "judge_score", "duration",
+)
+ATTEMPT_COLUMNS = (
+    "flow_id", "created_at", "attempt", "dag_id", "spec_hash", "judge_score", "passed", "reused", "issues", "error",
+)
+VALIDATION_COLUMNS = (
+    "flow_id", "created_at", "dag_id", "filename", "success", "errors", "warnings", "parse_time",
+)
+
+# Requests longer than this are stored truncated; request_hash still covers the full text
+MAX_REQUEST_CHARS = 2000
+
+
+class HistoryStore:
+    """
+    SQLite history store with a non-blocking background writer.
+
+    `record_*` methods never touch the database themselves; if the queue is
+    full the record is dropped (and counted) rather than slowing the caller.
+    """
+
+    def __init__(self, path: str, max_queue: int = 10000, batch_size: int = 200):
+        self.path = path
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._dropped = 0
+        self._written = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def record_flow(self, **fields):
+        """Queue a finished flow (see FLOW_COLUMNS); re-recording a flow_id replaces it."""
+        request = fields.get("request")
+        if isinstance(request, str) and len(request) > MAX_REQUEST_CHARS:
+            fields["request"] = request[:MAX_REQUEST_CHARS]
+        self._enqueue("flows", FLOW_COLUMNS, fields)
+
+    def record_attempt(self, **fields):
+        """Queue one generate+judge attempt (see ATTEMPT_COLUMNS)."""
+        fields["issues"] = _to_json(fields.get("issues"))
+        fields["passed"] = _to_bool_int(fields.get("passed"))
+        fields["reused"] = _to_bool_int(fields.get("reused"))
+        self._enqueue("attempts", ATTEMPT_COLUMNS, fields)
+
+    def record_validation(self, **fields):
+        """Queue one DAGValidator result (see VALIDATION_COLUMNS)."""
+        fields["errors"] = _to_json(fields.get("errors"))
+        fields["warnings"] = _to_json(fields.get("warnings"))
+        fields["success"] = _to_bool_int(fields.get("success"))
+        self._enqueue("validations", VALIDATION_COLUMNS, fields)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued record is written; returns False on timeout."""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def pass_rate_by_source_type(self, since: str = None) -> list:
+        """Flow count and success rate per source type, optionally since an ISO timestamp."""
+        where, params = ("WHERE created_at >= ?", (since,)) if since else ("", ())
+        rows = self._query(
+            f"SELECT source_type, COUNT(*) AS flows, SUM(status = 'success') AS passed "
+            f"FROM flows {where} GROUP BY source_type ORDER BY flows DESC",
+            params
+        )
+        for row in rows:
+            row["pass_rate"] = round(row["passed"] / row["flows"], 3) if row["flows"] else 0.0
+        return rows
+
+    def avg_attempts_by_shape(self, since: str = None) -> list:
+        """Average generation attempts per spec shape, for flows that reached generation."""
+        where = "WHERE attempts IS NOT NULL" + (" AND created_at >= ?" if since else "")
+        return self._query(
+            f"SELECT spec_shape, COUNT(*) AS flows, ROUND(AVG(attempts), 3) AS avg_attempts, "
+            f"ROUND(AVG(judge_score), 1) AS avg_judge_score "
+            f"FROM flows {where} GROUP BY spec_shape ORDER BY avg_attempts DESC",
+            (since,) if since else ()
+        )
+
+    def recent_flows(self, limit: int = 20, status: str = None, dag_id: str = None, request_hash: str = None) -> list:
+        """Newest flows first, optionally filtered on indexed columns."""
+        clauses, params = [], []
+        for column, value in (("status", status), ("dag_id", dag_id), ("request_hash", request_hash)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(f"SELECT * FROM flows {where} ORDER BY created_at DESC LIMIT ?", (*params, limit))
+
+    def get_flow(self, flow_id: str):
+        """A flow with its attempts and validations, or None."""
+        flows = self._query("SELECT * FROM flows WHERE flow_id = ?", (flow_id,))
+        if not flows:
+            return None
+        flow = flows[0]
+        flow["attempt_history"] = self._query("SELECT * FROM attempts WHERE flow_id = ? ORDER BY attempt", (flow_id,))
+        flow["validations"] = self._query("SELECT * FROM validations WHERE flow_id = ? ORDER BY id", (flow_id,))
+        for row in flow["attempt_history"]:
+            row["issues"] = _from_json(row["issues"])
+        for row in flow["validations"]:
+            row["errors"] = _from_json(row["errors"])
+            row["warnings"] = _from_json(row["warnings"])
+        return flow
+
+    def metrics(self) -> dict:
+        return {"queued": self._queue.qsize(), "written": self._written, "dropped": self._dropped}
+
+    def _enqueue(self, table: str, columns: tuple, fields: dict):
+        fields.setdefault("created_at", datetime.now().isoformat())
+        row = tuple(fields.get(column) for column in columns)
+        try:
+            self._queue.put_nowait((table, columns, row))
+        except queue.Full:
+            self._dropped += 1
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            rows = [item for item in batch if not isinstance(item, threading.Event)]
+            try:
+                with conn:
+                    for table, columns, row in rows:
+                        placeholders = ", ".join("?" for _ in columns)
+                        conn.execute(
+                            f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", row
+                        )
+                self._written += len(rows)
+            except sqlite3.Error as e:
+                self._dropped += len(rows)
+                logger.error("Could not write flow history", error=str(e), records=len(rows))
+
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+
+
+def _to_json(value):
+    return None if value is None else json.dumps(value, default=str)
+
+
+def _from_json(value):
+    return None if value is None else json.loads(value)
+
+
+def _to_bool_int(value):
+    return None if value is None else int(bool(value))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    """Process-wide history store at HISTORY_DB_PATH (default logs/history.db)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore(os.getenv("HISTORY_DB_PATH", os.path.join(PROJECT_ROOT, "logs", "history.db")))
+            # Give queued records a chance to land before the interpreter exits
+            atexit.register(_store.flush)
+        return _store
@@ -0,0 +1,51 @@
+import gzip
+import io
+
+from flask import request
+
+# Responses smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+
+
+class GzipRequestMiddleware:
+    """WSGI middleware that transparently inflates `Content-Encoding: gzip` request bodies."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if "gzip" in environ.get("HTTP_CONTENT_ENCODING", "").lower():
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+            try:
+                body = gzip.decompress(environ["wsgi.input"].read(length))
+            except (OSError, EOFError):
+                start_response("400 Bad Request", [("Content-Type", "text/plain")])
+                return [b"Invalid gzip request body"]
+            environ["wsgi.input"] = io.BytesIO(body)
+            environ["CONTENT_LENGTH"] = str(len(body))
+            del environ["HTTP_CONTENT_ENCODING"]
+        return self.wsgi_app(environ, start_response)
+
+
+def enable_gzip(app, min_size: int = COMPRESS_MIN_BYTES):
+    """Accept gzip request bodies and gzip large responses for clients that accept it."""
+    app.wsgi_app = GzipRequestMiddleware(app.wsgi_app)
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            "gzip" not in request.headers.get("Accept-Encoding", "").lower()
+            or response.direct_passthrough
+            or response.status_code < 200
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(gzip.compress(data, compresslevel=5))
+        response.headers["Content-Encoding"] = "gzip"
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    return app
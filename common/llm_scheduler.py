@@ -0,0 +1,318 @@
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from common.tracing import set_attribute
+from common.structured_logging import get_logger
+
+logger = get_logger("llm_scheduler")
+
+# Priority classes: lower runs first
+INTERACTIVE = 0
+BATCH = 1
+RETRY = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", RETRY: "retry"}
+
+# Tokens reserved for the model's answer on top of the prompt estimate
+OUTPUT_TOKEN_ALLOWANCE = 1024
+
+_current_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+class RateLimitError(Exception):
+    """Raised when an LLM call is still rate limited after all backoff retries."""
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """Run LLM calls made inside the block (in this thread/context) at `priority`."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Detect quota / 429 errors from the Gemini client, whatever exception type wraps them."""
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in ("429", "resourceexhausted", "resource exhausted", "quota", "rate limit"))
+
+
+def estimate_tokens(chain, inputs: dict) -> int:
+    """Rough token estimate (~4 characters per token) of a prompt plus the answer allowance."""
+    try:
+        prompt_text = chain.first.format(**inputs)
+    except Exception:
+        prompt_text = " ".join(str(value) for value in inputs.values())
+    return len(prompt_text) // 4 + OUTPUT_TOKEN_ALLOWANCE
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate_per_minute`, holding at most one minute of tokens."""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate_per_minute = rate_per_minute
+        self.tokens = rate_per_minute
+        self.last_refill = time.monotonic()
+
+    def refill(self, now: float):
+        elapsed = now - self.last_refill
+        self.tokens = min(self.rate_per_minute, self.tokens + elapsed * self.rate_per_minute / 60.0)
+        self.last_refill = now
+
+    def seconds_until(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (0 if they are now)."""
+        self.refill(now)
+        # A request larger than the bucket waits for a full bucket instead of forever
+        amount = min(amount, self.rate_per_minute)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.rate_per_minute
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.rate_per_minute)
+
+
+class _Ticket:
+    __slots__ = ("agent", "priority", "tokens", "enqueued_at")
+
+    def __init__(self, agent, priority, tokens):
+        self.agent = agent
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """
+    Central gate for every agent's LLM calls.
+
+    Calls wait in priority classes (interactive before batch before retries);
+    within a class, agents are served round-robin so one busy agent cannot
+    starve the others. A call is released only when both the requests/minute
+    and tokens/minute buckets have room. A 429/quota error halves the request
+    rate and backs off exponentially; further 429s inside that backoff window
+    (calls already in flight) don't halve it again. Successes restore the rate
+    gradually.
+
+    The scheduler is per process: separate processes (e.g. the batch runner
+    next to the controller service) each enforce the full limits and don't
+    see each other's priorities.
+    """
+
+    def __init__(self, requests_per_minute: float = 60, tokens_per_minute: float = 250000,
+                 max_retries: int = 5, base_backoff: float = 2.0):
+        self.configured_rpm = requests_per_minute
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+
+        self._cond = threading.Condition()
+        # priority -> agent -> queue of tickets; agent order is the round-robin order
+        self._queues = {priority: OrderedDict() for priority in PRIORITY_NAMES}
+        self._paused_until = 0.0
+        self._stats = {
+            "calls": 0,
+            "hedges": 0,
+            "hedges_refused": 0,
+            "rate_limited": 0,
+            "failed_after_retries": 0,
+            "wait_seconds": {name: [0, 0.0, 0.0] for name in PRIORITY_NAMES.values()},  # count, total, max
+        }
+
+    def invoke(self, chain, inputs: dict, agent: str, priority: int = None, estimated_tokens: int = None,
+               call=None):
+        """
+        Run `chain.invoke(inputs)` once the scheduler admits it.
+
+        Args:
+            chain: LangChain runnable to invoke
+            inputs (dict): Chain inputs
+            agent (str): Calling agent, used for fair queuing and metrics
+            priority (int): Priority class; defaults to the current llm_priority context
+            estimated_tokens (int): Token cost; estimated from the prompt if omitted
+            call (callable): Optional zero-argument function run in the admitted slot instead of
+                `chain.invoke(inputs)` (invoke_llm passes the StageGuard-wrapped call)
+
+        Returns:
+            The chain result
+
+        Raises:
+            RateLimitError: if the call is still rate limited after max_retries backoffs
+        """
+        if priority is None:
+            priority = _current_priority.get()
+        if estimated_tokens is None:
+            estimated_tokens = estimate_tokens(chain, inputs)
+
+        set_attribute("estimated_tokens", estimated_tokens)
+        set_attribute("priority", PRIORITY_NAMES[priority])
+        for attempt in range(self.max_retries + 1):
+            waited = self._acquire(_Ticket(agent, priority, estimated_tokens))
+            set_attribute("queue_wait", round(waited, 4))
+            set_attribute("rate_limit_retries", attempt)
+            try:
+                result = chain.invoke(inputs) if call is None else call()
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                backoff = self._on_rate_limited(attempt)
+                if attempt == self.max_retries:
+                    with self._cond:
+                        self._stats["failed_after_retries"] += 1
+                    raise RateLimitError(f"LLM rate limit exceeded after {self.max_retries} retries: {e}") from e
+                logger.warning("LLM rate limited, backing off", agent=agent, backoff=round(backoff, 1), attempt=attempt)
+                continue
+
+            self._on_success()
+            return result
+
+    def metrics(self) -> dict:
+        """Queue depth per class and agent, wait times, 429 counts and current limits."""
+        with self._cond:
+            waits = {}
+            for name, (count, total, longest) in self._stats["wait_seconds"].items():
+                waits[name] = {
+                    "count": count,
+                    "avg": round(total / count, 4) if count else 0.0,
+                    "max": round(longest, 4),
+                }
+            return {
+                "queue_depth": {
+                    PRIORITY_NAMES[priority]: {agent: len(queue) for agent, queue in agents.items() if queue}
+                    for priority, agents in self._queues.items()
+                },
+                "wait_seconds": waits,
+                "calls": self._stats["calls"],
+                "hedges": self._stats["hedges"],
+                "hedges_refused": self._stats["hedges_refused"],
+                "rate_limited": self._stats["rate_limited"],
+                "failed_after_retries": self._stats["failed_after_retries"],
+                "requests_per_minute": round(self.request_bucket.rate_per_minute, 2),
+                "tokens_per_minute": self.token_bucket.rate_per_minute,
+            }
+
+    def _acquire(self, ticket: _Ticket):
+        """Block until `ticket` is next in line and both buckets can pay for it; returns seconds waited."""
+        with self._cond:
+            self._queues[ticket.priority].setdefault(ticket.agent, deque()).append(ticket)
+            self._cond.notify_all()
+
+            while True:
+                if self._next_ticket() is ticket:
+                    now = time.monotonic()
+                    wait = max(
+                        self._paused_until - now,
+                        self.request_bucket.seconds_until(1, now),
+                        self.token_bucket.seconds_until(ticket.tokens, now),
+                    )
+                    if wait <= 0:
+                        break
+                    self._cond.wait(timeout=wait)
+                else:
+                    self._cond.wait()
+
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(ticket.tokens)
+
+            agents = self._queues[ticket.priority]
+            agents[ticket.agent].popleft()
+            # Served agent goes to the back of the round-robin order
+            agents.move_to_end(ticket.agent)
+
+            waited = time.monotonic() - ticket.enqueued_at
+            wait_stats = self._stats["wait_seconds"][PRIORITY_NAMES[ticket.priority]]
+            wait_stats[0] += 1
+            wait_stats[1] += waited
+            wait_stats[2] = max(wait_stats[2], waited)
+            self._stats["calls"] += 1
+            self._cond.notify_all()
+            return waited
+
+    def try_acquire(self, agent: str, estimated_tokens: int) -> bool:
+        """
+        Pay for an extra request (a hedge) now if the buckets allow it, without queueing.
+
+        Refused while calls are queued or the scheduler is backing off, so a
+        hedge never overtakes a waiting call or adds to a 429 storm.
+        """
+        with self._cond:
+            now = time.monotonic()
+            if (self._next_ticket() is not None or now < self._paused_until
+                    or self.request_bucket.seconds_until(1, now) > 0
+                    or self.token_bucket.seconds_until(estimated_tokens, now) > 0):
+                self._stats["hedges_refused"] += 1
+                return False
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(estimated_tokens)
+            self._stats["calls"] += 1
+            self._stats["hedges"] += 1
+        logger.debug("Hedge admitted", agent=agent, estimated_tokens=estimated_tokens)
+        return True
+
+    def _next_ticket(self):
+        """The ticket to serve next: highest priority class, round-robin across agents."""
+        for priority in sorted(self._queues):
+            for queue in self._queues[priority].values():
+                if queue:
+                    return queue[0]
+        return None
+
+    def _on_rate_limited(self, attempt: int) -> float:
+        """Halve the request rate (once per backoff window) and pause everyone for an exponential backoff."""
+        backoff = self.base_backoff * (2 ** attempt)
+        with self._cond:
+            self._stats["rate_limited"] += 1
+            now = time.monotonic()
+            if now >= self._paused_until:
+                bucket = self.request_bucket
+                bucket.refill(now)
+                bucket.rate_per_minute = max(1.0, bucket.rate_per_minute / 2)
+                bucket.tokens = min(bucket.tokens, bucket.rate_per_minute)
+            self._paused_until = max(self._paused_until, now + backoff)
+            self._cond.notify_all()
+        return backoff
+
+    def _on_success(self):
+        """Additively restore the request rate towards the configured limit."""
+        with self._cond:
+            bucket = self.request_bucket
+            if bucket.rate_per_minute < self.configured_rpm:
+                bucket.refill(time.monotonic())
+                bucket.rate_per_minute = min(self.configured_rpm, bucket.rate_per_minute + self.configured_rpm * 0.1)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+# Fraction of the configured limits this process may use
+_rate_share = 1.0
+
+
+def set_rate_share(share: float):
+    """
+    Limit this process to `share` of LLM_REQUESTS_PER_MINUTE and LLM_TOKENS_PER_MINUTE.
+
+    common.prefork sets 1/N before forking N workers, so that together they
+    stay within the configured quota. The scheduler is re-created on next use.
+    """
+    global _scheduler, _rate_share
+    with _scheduler_lock:
+        _rate_share = share
+        _scheduler = None
+
+
+def get_scheduler() -> LLMScheduler:
+    """Process-wide scheduler configured from LLM_REQUESTS_PER_MINUTE and LLM_TOKENS_PER_MINUTE."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60")) * _rate_share,
+                tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "250000")) * _rate_share,
+            )
+        return _scheduler
@@ -0,0 +1,418 @@
+"""
+Complexity-based model routing for the agents' LLM calls.
+
+Each call is scored 0-1 for difficulty and mapped to a model tier. Decisions,
+latencies and judge outcomes are appended to a JSONL log by a background
+writer; the log is rotated to `<path>.1` past ROUTING_LOG_MAX_BYTES, so the
+judge history replayed at startup covers at most the current and the previous
+file. `replay()` re-scores that log under different thresholds so they can be
+tuned offline:
+
+    python common/model_router.py logs/model_routing.jsonl --fast-below 0.2 --strong-from 0.5
+"""
+
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotation is not coordinated between processes
+    fcntl = None
+
+from common.tracing import set_attribute
+from common.structured_logging import get_logger
+
+logger = get_logger("model_router")
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TIER_ORDER = ["fast", "standard", "strong"]
+TIER_MODELS = {
+    "fast": os.getenv("LLM_MODEL_FAST", "gemini-2.5-flash-lite"),
+    "standard": os.getenv("LLM_MODEL_STANDARD", "gemini-2.5-flash"),
+    "strong": os.getenv("LLM_MODEL_STRONG", "gemini-2.5-pro"),
+}
+TIER_TEMPERATURE = 0.1
+
+# Score < fast_below -> fast, score >= strong_from -> strong, otherwise standard
+DEFAULT_THRESHOLDS = {
+    "fast_below": float(os.getenv("ROUTING_FAST_BELOW", "0.25")),
+    "strong_from": float(os.getenv("ROUTING_STRONG_FROM", "0.6")),
+}
+
+# Request words that usually mean multi-step work for the parser
+COMPLEX_REQUEST_WORDS = ("join", "aggregate", "group", "dedup", "merge", "pivot", "incremental", "api", "transform", "clean")
+
+
+def spec_hash(pipeline_spec: dict) -> str:
+    """Hash of a spec without retry feedback, so every attempt of one spec shares it."""
+    spec = {key: value for key, value in pipeline_spec.items() if key != "feedback"}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def spec_shape(pipeline_spec: dict) -> str:
+    """Coarse shape of a spec (source type, destination type, transformation count)."""
+    source = pipeline_spec.get("source") or {}
+    destination = pipeline_spec.get("destination") or {}
+    transformations = pipeline_spec.get("transformations") or []
+    source_type = str(source.get("type", "unknown")).lower() if isinstance(source, dict) else "unknown"
+    destination_type = str(destination.get("type", "unknown")).lower() if isinstance(destination, dict) else "unknown"
+    count = len(transformations) if isinstance(transformations, list) else 0
+    return f"{source_type}->{destination_type}/t{min(count, 3)}"
+
+
+def tier_for_score(score: float, thresholds: dict) -> str:
+    if score < thresholds["fast_below"]:
+        return "fast"
+    if score >= thresholds["strong_from"]:
+        return "strong"
+    return "standard"
+
+
+class ModelRouter:
+    """Scores each LLM job and picks a model tier; logs decisions and outcomes."""
+
+    def __init__(self, thresholds: dict = None, log_path: str = None, max_bytes: int = None,
+                 max_queue: int = 10000, batch_size: int = 200):
+        self.thresholds = dict(thresholds or DEFAULT_THRESHOLDS)
+        self.log_path = log_path or os.getenv(
+            "ROUTING_LOG_PATH", os.path.join(PROJECT_ROOT, "logs", "model_routing.jsonl")
+        )
+        self.max_bytes = max_bytes or int(os.getenv("ROUTING_LOG_MAX_BYTES", str(20 * 1024 * 1024)))
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._writer_lock = threading.Lock()
+        self._writer_pid = None
+        self._queue = None
+        self._dropped = 0
+        self._written = 0
+        # spec shape -> [judged, failed]
+        self._judge_history = {}
+        self._load_judge_history()
+
+    def route(self, stage: str, pipeline_spec: dict = None, request: str = None) -> dict:
+        """
+        Pick a model for one LLM call.
+
+        Args:
+            stage (str): parser, generator or judge
+            pipeline_spec (dict): Spec being generated/judged (generator and judge)
+            request (str): Raw request text (parser)
+
+        Returns:
+            dict: Decision with decision_id, tier, model, temperature, score and features
+        """
+        if pipeline_spec is not None:
+            features = self._spec_features(pipeline_spec)
+        else:
+            features = self._request_features(request or "")
+
+        score = round(min(1.0, sum(features["weights"].values())), 3)
+        tier = tier_for_score(score, self.thresholds)
+
+        # Each retry escalates one tier
+        attempt = features.get("attempt", 1)
+        tier_index = min(len(TIER_ORDER) - 1, TIER_ORDER.index(tier) + attempt - 1)
+        tier = TIER_ORDER[tier_index]
+
+        decision = {
+            "type": "decision",
+            "decision_id": uuid.uuid4().hex,
+            "stage": stage,
+            "tier": tier,
+            "model": TIER_MODELS[tier],
+            "temperature": TIER_TEMPERATURE,
+            "score": score,
+            "features": features,
+            "timestamp": datetime.now().isoformat(),
+        }
+        self._append(decision)
+        set_attribute(f"{stage}_model", decision["model"])
+        set_attribute(f"{stage}_routing_score", score)
+        return decision
+
+    def record_outcome(self, decision: dict, latency: float, success: bool):
+        """Log how a routed call went (latency in seconds, whether it produced usable output)."""
+        self._append({
+            "type": "outcome",
+            "decision_id": decision["decision_id"],
+            "latency": round(latency, 3),
+            "success": success,
+            "timestamp": datetime.now().isoformat(),
+        })
+
+    def record_judgement(self, pipeline_spec: dict, score: float, passed: bool):
+        """Log the judge verdict for a generated spec; feeds the judge-history routing input."""
+        features = self._spec_features(pipeline_spec)
+        shape = features["shape"]
+        with self._lock:
+            history = self._judge_history.setdefault(shape, [0, 0])
+            history[0] += 1
+            history[1] += 0 if passed else 1
+        self._append({
+            "type": "judgement",
+            "spec_hash": features["spec_hash"],
+            "attempt": features["attempt"],
+            "shape": shape,
+            "judge_score": score,
+            "passed": passed,
+            "timestamp": datetime.now().isoformat(),
+        })
+
+    def _spec_features(self, pipeline_spec: dict) -> dict:
+        source = pipeline_spec.get("source") or {}
+        destination = pipeline_spec.get("destination") or {}
+        transformations = pipeline_spec.get("transformations") or []
+        if not isinstance(transformations, list):
+            transformations = []
+
+        try:
+            confidence = float(pipeline_spec.get("confidence", 0.5))
+        except (TypeError, ValueError):
+            confidence = 0.5
+
+        source_type = str(source.get("type", "")).lower() if isinstance(source, dict) else ""
+        destination_type = str(destination.get("type", "")).lower() if isinstance(destination, dict) else ""
+        non_file_endpoints = sum(1 for endpoint_type in (source_type, destination_type) if endpoint_type not in ("file", ""))
+        incremental = isinstance(source, dict) and bool(source.get("incremental"))
+
+        shape = spec_shape(pipeline_spec)
+        with self._lock:
+            judged, failed = self._judge_history.get(shape, (0, 0))
+        failure_rate = failed / judged if judged >= 3 else 0.0
+
+        return {
+            "spec_hash": spec_hash(pipeline_spec),
+            "shape": shape,
+            "attempt": len(pipeline_spec.get("feedback", [])) + 1,
+            "weights": {
+                "low_confidence": round((1 - max(0.0, min(1.0, confidence))) * 0.35, 3),
+                "transformations": round(min(len(transformations), 5) / 5 * 0.3, 3),
+                "endpoints": 0.1 * non_file_endpoints,
+                "incremental": 0.1 if incremental else 0.0,
+                "judge_failures": round(failure_rate * 0.2, 3),
+            },
+        }
+
+    def _request_features(self, request: str) -> dict:
+        lowered = request.lower()
+        words = len(lowered.split())
+        keywords = sum(1 for word in COMPLEX_REQUEST_WORDS if word in lowered)
+        return {
+            "attempt": 1,
+            "weights": {
+                "length": round(min(words, 120) / 120 * 0.4, 3),
+                "keywords": round(min(keywords, 5) / 5 * 0.4, 3),
+            },
+        }
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued record is written; returns False on timeout."""
+        if self._writer_pid != os.getpid():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def metrics(self) -> dict:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "written": self._written,
+            "dropped": self._dropped,
+        }
+
+    def _append(self, record: dict):
+        """Queue a record for the background writer; a full queue drops it."""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._dropped += 1
+
+    def _ensure_writer(self):
+        # Threads don't survive fork(): a forked worker starts its own writer and queue
+        if self._writer_pid == os.getpid():
+            return
+        with self._writer_lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            threading.Thread(target=self._write_loop, args=(self._queue,), name="routing-writer", daemon=True).start()
+            self._writer_pid = os.getpid()
+
+    def _write_loop(self, record_queue: queue.Queue):
+        while True:
+            batch = [record_queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(record_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [item for item in batch if not isinstance(item, threading.Event)]
+            if records:
+                data = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+                try:
+                    self._write(data)
+                    self._written += len(records)
+                except OSError as e:
+                    self._dropped += len(records)
+                    logger.error("Could not write routing log", error=str(e), records=len(records))
+
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _write(self, data: bytes):
+        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+        # One O_APPEND write per batch, so lines from concurrent processes never interleave
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size > self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        """Move the log to <path>.1 (replacing the previous one), once across processes sharing it."""
+        lock_fd = os.open(f"{self.log_path}.lock", os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            # Another process may have rotated while we waited for the lock
+            if os.path.getsize(self.log_path) > self.max_bytes:
+                os.replace(self.log_path, f"{self.log_path}.1")
+                logger.info("Rotated routing log", path=self.log_path)
+        except FileNotFoundError:
+            pass
+        finally:
+            os.close(lock_fd)
+
+    def _load_judge_history(self):
+        for record in _read_log(self.log_path):
+            if record.get("type") == "judgement":
+                history = self._judge_history.setdefault(record["shape"], [0, 0])
+                history[0] += 1
+                history[1] += 0 if record.get("passed") else 1
+
+
+class RoutedCall:
+    """Times a routed LLM call and records its outcome: `with RoutedCall(router, decision) as call: ...`."""
+
+    def __init__(self, router: ModelRouter, decision: dict):
+        self.router = router
+        self.decision = decision
+        self.success = True
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.router.record_outcome(self.decision, time.monotonic() - self.start, self.success and exc_type is None)
+        return False
+
+
+def _read_log(log_path: str):
+    """Records of the rotated log (<path>.1), if any, then of the current one."""
+    for path in (f"{log_path}.1", log_path):
+        if not os.path.exists(path):
+            continue
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def replay(log_path: str, thresholds: dict) -> dict:
+    """
+    Re-route every logged decision under `thresholds` and compare with what happened.
+
+    Returns:
+        dict: Per-stage counts of tier changes plus observed latency and
+            success/judge pass rates of the original tiers, so the cost of
+            moving calls between tiers can be judged offline
+    """
+    decisions, outcomes, judgements = [], {}, {}
+    for record in _read_log(log_path):
+        if record.get("type") == "decision":
+            decisions.append(record)
+        elif record.get("type") == "outcome":
+            outcomes[record["decision_id"]] = record
+        elif record.get("type") == "judgement":
+            judgements[(record["spec_hash"], record["attempt"])] = record
+
+    report = {}
+    for decision in decisions:
+        stage = report.setdefault(decision["stage"], {"decisions": 0, "changed": {}, "observed": {}})
+        stage["decisions"] += 1
+
+        features = decision.get("features", {})
+        new_tier = tier_for_score(decision["score"], thresholds)
+        new_index = min(len(TIER_ORDER) - 1, TIER_ORDER.index(new_tier) + features.get("attempt", 1) - 1)
+        new_tier = TIER_ORDER[new_index]
+        if new_tier != decision["tier"]:
+            key = f"{decision['tier']}->{new_tier}"
+            stage["changed"][key] = stage["changed"].get(key, 0) + 1
+
+        observed = stage["observed"].setdefault(decision["tier"], {"calls": 0, "latency": 0.0, "successes": 0, "judged": 0, "passed": 0})
+        observed["calls"] += 1
+        outcome = outcomes.get(decision["decision_id"])
+        if outcome:
+            observed["latency"] += outcome["latency"]
+            observed["successes"] += 1 if outcome["success"] else 0
+        judgement = judgements.get((features.get("spec_hash"), features.get("attempt")))
+        if decision["stage"] == "generator" and judgement:
+            observed["judged"] += 1
+            observed["passed"] += 1 if judgement["passed"] else 0
+
+    for stage in report.values():
+        for observed in stage["observed"].values():
+            calls = observed["calls"]
+            observed["avg_latency"] = round(observed.pop("latency") / calls, 3) if calls else 0.0
+            observed["success_rate"] = round(observed.pop("successes") / calls, 3) if calls else 0.0
+            judged, passed = observed.pop("judged"), observed.pop("passed")
+            observed["judge_pass_rate"] = round(passed / judged, 3) if judged else None
+    return report
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    """Process-wide model router."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+            # Give queued records a chance to land before the interpreter exits
+            atexit.register(_router.flush)
+        return _router
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Replay logged routing decisions under new thresholds")
+    arg_parser.add_argument("log_path", nargs="?", default=os.path.join(PROJECT_ROOT, "logs", "model_routing.jsonl"))
+    arg_parser.add_argument("--fast-below", type=float, default=DEFAULT_THRESHOLDS["fast_below"])
+    arg_parser.add_argument("--strong-from", type=float, default=DEFAULT_THRESHOLDS["strong_from"])
+    args = arg_parser.parse_args()
+
+    result = replay(args.log_path, {"fast_below": args.fast_below, "strong_from": args.strong_from})
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,126 @@
+"""
+Fork-after-warmup serving for the Flask services.
+
+`serve(app, host, port)` replaces `app.run(...)` in the services' __main__
+blocks. By default it is exactly `app.run`. With PREFORK_WORKERS=N it binds
+the listening socket, runs `assets.preload()` once, and forks N worker
+processes that share the socket: workers inherit the imported LLM stack,
+prompt templates and parsers copy-on-write and serve their first request
+warm, and a worker that dies is replaced.
+
+Process-wide singletons (history store, trace store, scheduler) are created
+on first use, so each worker gets its own; the log writer thread is
+restarted in each worker by common.structured_logging. Each worker's LLM
+scheduler gets 1/N of LLM_REQUESTS_PER_MINUTE and LLM_TOKENS_PER_MINUTE,
+so the workers together stay within the configured quota, and the trace
+store finds spans written by any worker because it indexes the shared file.
+
+Configuration (environment):
+    PREFORK_WORKERS  number of worker processes (default 0: plain app.run)
+    PRELOAD_ASSETS   "1" to preload assets before app.run when not forking
+"""
+
+import gc
+import os
+import signal
+import sys
+import threading
+import time
+
+from common import assets
+from common.llm_scheduler import set_rate_share
+from common.structured_logging import get_logger
+
+logger = get_logger("prefork")
+
+# A worker that exits sooner than this after starting is respawned after a pause
+RESPAWN_BACKOFF = 1.0
+# How often a worker checks that the parent is still alive
+PARENT_CHECK_INTERVAL = 1.0
+
+
+def serve(app, host: str, port: int, debug: bool = False):
+    """Run `app` with the Flask dev server, or prefork workers when PREFORK_WORKERS is set."""
+    workers = int(os.getenv("PREFORK_WORKERS", "0"))
+    if workers > 0 and hasattr(os, "fork"):
+        serve_prefork(app, host, port, workers)
+        return
+    if os.getenv("PRELOAD_ASSETS") == "1":
+        assets.preload()
+    app.run(debug=debug, host=host, port=port)
+
+
+def serve_prefork(app, host: str, port: int, workers: int):
+    """Bind, warm up once, then fork `workers` processes accepting on the shared socket."""
+    from werkzeug.serving import make_server
+
+    server = make_server(host, port, app, threaded=True)
+    timings = assets.preload()
+    # Split the LLM quota between the workers' schedulers
+    set_rate_share(1.0 / workers)
+    # Keep the warmed-up heap out of the collector so workers don't copy it by touching refcounts
+    gc.collect()
+    gc.freeze()
+    logger.info("Prefork server warmed up", host=host, port=port, workers=workers, **timings)
+
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(server)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+        logger.warning("Prefork worker exited, respawning", pid=pid, exit_status=status)
+        if time.monotonic() - started < RESPAWN_BACKOFF:
+            time.sleep(RESPAWN_BACKOFF)
+        spawn()
+
+    server.server_close()
+    logger.info("Prefork server stopped")
+
+
+def _run_worker(server):
+    """Serve in a forked worker until SIGTERM/SIGINT, then exit normally so atexit hooks flush."""
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    logger.info("Prefork worker started", pid=os.getpid())
+    threading.Thread(target=_exit_with_parent, args=(server, os.getppid()), name="prefork-parent-watch", daemon=True).start()
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+    sys.exit(0)
+
+
+def _exit_with_parent(server, parent_pid: int):
+    """Stop serving if the parent dies (e.g. SIGKILL) rather than keep running orphaned."""
+    while os.getppid() == parent_pid:
+        time.sleep(PARENT_CHECK_INTERVAL)
+    logger.warning("Prefork parent exited, stopping worker", pid=os.getpid())
+    server.shutdown()
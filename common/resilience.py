@@ -0,0 +1,303 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from common.llm_scheduler import get_scheduler, is_rate_limit_error, estimate_tokens
+from common.tracing import span, set_attribute
+from common.structured_logging import get_logger
+
+logger = get_logger("resilience")
+
+# Per-stage deadlines in seconds, overridable with LLM_DEADLINE_<STAGE>
+DEFAULT_DEADLINES = {"parser": 60.0, "generator": 180.0, "judge": 90.0}
+
+# google.api_core / HTTP client error classes meaning the upstream is unavailable or failing (5xx)
+UPSTREAM_ERROR_NAMES = {
+    "ServerError", "InternalServerError", "ServiceUnavailable", "BadGateway", "GatewayTimeout", "DeadlineExceeded",
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised when a stage's circuit breaker is open and no fallback is available."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a stage's LLM call does not answer before its deadline."""
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """
+    Transport errors, timeouts and 5xx answers: the failures that mean the LLM upstream is degraded.
+
+    Quota errors (the scheduler backs off on those) and errors about the
+    answer itself, such as an output parser rejecting malformed JSON, don't.
+    """
+    if is_rate_limit_error(error):
+        return False
+    # DeadlineExceededError is a TimeoutError; socket and connection errors are OSErrors
+    if isinstance(error, (TimeoutError, OSError)):
+        return True
+    if any(cls.__name__ in UPSTREAM_ERROR_NAMES for cls in type(error).__mro__):
+        return True
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return isinstance(status, int) and 500 <= status < 600
+
+
+class StageGuard:
+    """
+    Tail-latency and failure control for one stage's LLM calls.
+
+    - Hedging: once enough latencies are known, a call still running after the
+      stage's p95 gets a duplicate request; whichever answers first wins.
+    - Deadline: the caller gets DeadlineExceededError after `deadline` seconds.
+    - Circuit breaker: after `failure_threshold` consecutive upstream failures
+      (see is_upstream_failure) the stage fails fast (or uses the fallback)
+      for `cooldown` seconds, then lets one probe call through to decide
+      whether to close again.
+
+    With an `admit` function (the LLM scheduler) the hedge, deadline and
+    latency cover only the upstream call, not the wait for a scheduler slot.
+    With `charge_hedge`, a hedge is only sent if that function pays for it
+    (the scheduler's try_acquire); otherwise the call keeps waiting alone.
+
+    A call that lost a hedge or missed its deadline cannot be cancelled; it
+    finishes in the background and its result is discarded.
+    """
+
+    def __init__(self, stage: str, deadline: float, executor: ThreadPoolExecutor,
+                 min_samples: int = 20, min_hedge_delay: float = 1.0,
+                 failure_threshold: int = 5, cooldown: float = 30.0):
+        self.stage = stage
+        self.deadline = deadline
+        self.executor = executor
+        self.min_samples = min_samples
+        self.min_hedge_delay = min_hedge_delay
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=200)
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._stats = {
+            "calls": 0, "failures": 0, "deadline_exceeded": 0, "hedged": 0, "hedge_wins": 0,
+            "saved_latency_seconds": 0.0, "short_circuited": 0, "fallbacks": 0, "circuit_opened": 0,
+            "hedges_skipped": 0,
+        }
+
+    def call(self, fn, fallback=None, admit=None, charge_hedge=None):
+        """
+        Run `fn()` with hedging, a deadline and the circuit breaker.
+
+        Args:
+            fn (callable): Zero-argument function making the LLM call
+            fallback (callable): Optional zero-argument fast path used while the circuit is open
+            admit (callable): Optional `admit(run)` that calls the zero-argument `run` once
+                the call is admitted, e.g. by the LLM scheduler
+            charge_hedge (callable): Optional zero-argument function returning whether a
+                hedge could be paid for; the hedge is skipped when it returns False
+
+        Returns:
+            The result of `fn()` (or of `fallback()` when short-circuited)
+        """
+        if not self._allow_call():
+            with self._lock:
+                self._stats["short_circuited"] += 1
+                if fallback:
+                    self._stats["fallbacks"] += 1
+            if fallback:
+                return fallback()
+            raise CircuitOpenError(f"LLM circuit for '{self.stage}' is open; upstream degraded")
+
+        with self._lock:
+            self._stats["calls"] += 1
+        if admit is None:
+            return self._run_guarded(fn, charge_hedge)
+        return admit(lambda: self._run_guarded(fn, charge_hedge))
+
+    def p95(self):
+        """p95 latency of recent successful calls, or None until min_samples are known."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def metrics(self) -> dict:
+        p95 = self.p95()
+        with self._lock:
+            stats = dict(self._stats)
+            stats["saved_latency_seconds"] = round(stats["saved_latency_seconds"], 3)
+            stats["hedge_rate"] = round(stats["hedged"] / stats["calls"], 4) if stats["calls"] else 0.0
+            stats["p95_seconds"] = round(p95, 3) if p95 is not None else None
+            stats["circuit"] = self._circuit_state()
+        return stats
+
+    def _run_guarded(self, fn, charge_hedge=None):
+        start = time.monotonic()
+        try:
+            result = self._run_hedged(fn, start, charge_hedge)
+        except Exception as e:
+            if is_upstream_failure(e):
+                self._record_failure()
+            else:
+                # The upstream answered (or was never reached): neither close nor reopen the circuit
+                self._release_probe()
+            raise
+
+        self._record_success(time.monotonic() - start)
+        return result
+
+    def _run_hedged(self, fn, start, charge_hedge=None):
+        deadline_at = start + self.deadline
+        primary = self._submit(fn)
+        futures = {primary}
+
+        hedge_delay = self.p95()
+        if hedge_delay is not None:
+            hedge_delay = max(hedge_delay, self.min_hedge_delay)
+            done, _ = wait(futures, timeout=min(hedge_delay, self.deadline))
+            if not done and time.monotonic() < deadline_at and self._circuit_state() == "closed":
+                if charge_hedge is not None and not charge_hedge():
+                    # No quota to spare for a duplicate request: a hedge now would only earn a 429
+                    with self._lock:
+                        self._stats["hedges_skipped"] += 1
+                else:
+                    hedge = self._submit(fn)
+                    futures.add(hedge)
+                    with self._lock:
+                        self._stats["hedged"] += 1
+                    set_attribute("hedged", True)
+                    logger.info("Hedging slow LLM call", stage=self.stage, hedge_delay=round(hedge_delay, 2))
+
+        error = None
+        while futures:
+            done, futures = wait(futures, timeout=max(0.0, deadline_at - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                with self._lock:
+                    self._stats["deadline_exceeded"] += 1
+                raise DeadlineExceededError(f"'{self.stage}' LLM call exceeded its {self.deadline:.0f}s deadline")
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self._record_hedge_win(primary)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _submit(self, fn):
+        # Copy the context so the scheduler priority (and tracing) follow the call
+        context = contextvars.copy_context()
+        return self.executor.submit(context.run, fn)
+
+    def _record_hedge_win(self, primary):
+        won_at = time.monotonic()
+        with self._lock:
+            self._stats["hedge_wins"] += 1
+
+        def record_saving(future):
+            # Time the hedge saved = how much longer the primary took to answer
+            if future.exception() is not None:
+                return
+            with self._lock:
+                self._stats["saved_latency_seconds"] += max(0.0, time.monotonic() - won_at)
+
+        primary.add_done_callback(record_saving)
+
+    def _allow_call(self) -> bool:
+        with self._lock:
+            state = self._circuit_state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def _circuit_state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def _record_success(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def _release_probe(self):
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _record_failure(self):
+        with self._lock:
+            self._stats["failures"] += 1
+            self._consecutive_failures += 1
+            if self._probe_in_flight or self._consecutive_failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    self._stats["circuit_opened"] += 1
+                    logger.warning("LLM circuit opened", stage=self.stage, failures=self._consecutive_failures)
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_CALL_WORKERS", "32")), thread_name_prefix="llm-call")
+
+
+def get_stage_guard(stage: str) -> StageGuard:
+    """Process-wide StageGuard for a stage, with its deadline from LLM_DEADLINE_<STAGE>."""
+    with _guards_lock:
+        if stage not in _guards:
+            deadline = float(os.getenv(f"LLM_DEADLINE_{stage.upper()}", DEFAULT_DEADLINES.get(stage, 120.0)))
+            _guards[stage] = StageGuard(stage, deadline, _executor)
+        return _guards[stage]
+
+
+def invoke_llm(chain, inputs: dict, agent: str, fallback=None):
+    """
+    Invoke an agent's chain through the shared scheduler, guarded by the agent's StageGuard.
+
+    The circuit is checked before queueing; once the scheduler admits the
+    call, the guard hedges and deadlines the upstream request itself. A hedge
+    is sent only if the scheduler's buckets can pay for it right away.
+
+    Args:
+        chain: LangChain runnable to invoke
+        inputs (dict): Chain inputs
+        agent (str): Stage name (parser, generator, judge)
+        fallback (callable): Optional fast path used while the stage's circuit is open
+
+    Returns:
+        The chain result
+    """
+    with span(f"llm.{agent}") as llm_span:
+        scheduler = get_scheduler()
+        tokens = estimate_tokens(chain, inputs)
+        result = get_stage_guard(agent).call(
+            lambda: chain.invoke(inputs),
+            fallback,
+            admit=lambda run: scheduler.invoke(chain, inputs, agent=agent, estimated_tokens=tokens, call=run),
+            # A hedge is a second upstream request: it pays the buckets like any other call
+            charge_hedge=lambda: scheduler.try_acquire(agent, tokens)
+        )
+        content = getattr(result, "content", None)
+        if isinstance(content, str):
+            llm_span.attributes["output_chars"] = len(content)
+            llm_span.attributes["output_tokens_estimate"] = len(content) // 4
+        return result
+
+
+def resilience_metrics() -> dict:
+    """StageGuard metrics for every stage used so far."""
+    with _guards_lock:
+        guards = list(_guards.values())
+    return {guard.stage: guard.metrics() for guard in guards}
@@ -0,0 +1,213 @@
+import gzip
+import http.client
+import json
+import os
+import queue
+import select
+import threading
+import time
+from urllib.parse import urlsplit
+
+from common.structured_logging import get_logger
+from common.tracing import current_trace_id, current_span_id
+
+logger = get_logger("service_client")
+
+# Request bodies at least this large are gzip-compressed
+COMPRESS_MIN_BYTES = 1024
+
+
+
+class ServiceError(Exception):
+    """Raised when no replica of a service answered in time."""
+
+
+class _Replica:
+    """One service replica with its pool of idle keep-alive connections."""
+
+    def __init__(self, url: str, pool_size: int):
+        parts = urlsplit(url)
+        self.url = url.rstrip("/")
+        self.scheme = parts.scheme or "http"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.idle = queue.LifoQueue(maxsize=pool_size)
+        self.down_until = 0.0
+        self.stats = {"requests": 0, "failures": 0, "connections_opened": 0}
+        self._stats_lock = threading.Lock()
+
+    def count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def acquire(self, timeout: float):
+        """
+        A connected idle pooled connection, or a newly connected one.
+
+        Idle connections the server has closed are discarded here, before
+        anything is sent on them. Raises OSError if connecting fails.
+        """
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                return self.connect(timeout)
+            if not _is_dropped(conn):
+                return conn
+            conn.close()
+
+    def connect(self, timeout: float):
+        self.count("connections_opened")
+        connection_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        conn = connection_class(self.host, self.port, timeout=timeout)
+        try:
+            conn.connect()
+        except OSError:
+            conn.close()
+            raise
+        return conn
+
+    def release(self, conn):
+        try:
+            self.idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+class ServiceClient:
+    """
+    Pooled keep-alive HTTP client for one stage service with several replicas.
+
+    Requests go round-robin across replicas; a replica that can't be
+    connected to is skipped for `cooldown` seconds and the request is tried on
+    the next one. A request is never re-sent once it may have reached a
+    replica: the stage calls are not idempotent (each one is an LLM call), so
+    a failure after sending raises ServiceError instead. Large request bodies
+    are gzip-compressed and gzip responses are accepted.
+    """
+
+    def __init__(self, name: str, urls: list, timeout: float = 120.0, pool_size: int = 8, cooldown: float = 10.0):
+        if not urls:
+            raise ValueError(f"No replica URLs configured for service '{name}'")
+        self.name = name
+        self.timeout = timeout
+        self.cooldown = cooldown
+        self.replicas = [_Replica(url, pool_size) for url in urls]
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str, variable: str, timeout: float = 120.0):
+        """Client for a comma-separated replica list in environment `variable`."""
+        urls = [url.strip() for url in os.getenv(variable, "").split(",") if url.strip()]
+        return cls(name, urls, timeout=timeout)
+
+    def post_json(self, path: str, payload: dict):
+        """
+        POST `payload` as JSON and return (status, parsed body).
+
+        The body is parsed as JSON when the response says so, otherwise
+        returned as text. HTTP error statuses are returned, not raised;
+        ServiceError is raised on a timeout, when the connection fails after
+        the request was sent, or when every replica is unreachable.
+        """
+        status, _, body = self.post(path, payload)
+        return status, body
+
+    def post(self, path: str, payload: dict):
+        """Like post_json, but returns (status, response headers, parsed body)."""
+        body = json.dumps(payload).encode("utf-8")
+        headers = {
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip",
+            "Connection": "keep-alive",
+        }
+        if len(body) >= COMPRESS_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        # The services continue this trace, with their spans under the current one
+        trace_id = current_trace_id()
+        if trace_id:
+            headers["X-Trace-Id"] = trace_id
+            headers["X-Parent-Span-Id"] = current_span_id()
+
+        last_error = None
+        for replica in self._replica_order():
+            try:
+                conn = replica.acquire(self.timeout)
+            except OSError as e:
+                # Connection refused, reset or timed out while connecting: nothing was sent, try the next replica
+                last_error = e
+                self._mark_down(replica, e)
+                continue
+            try:
+                status, response_headers, data = self._send(replica, conn, "POST", path, body, headers)
+            except TimeoutError as e:
+                replica.count("failures")
+                raise ServiceError(f"'{self.name}' replica {replica.url} timed out after {self.timeout:.0f}s") from e
+            except (OSError, http.client.HTTPException) as e:
+                # The replica may have received the request; re-sending it could run the stage twice
+                self._mark_down(replica, e)
+                raise ServiceError(f"'{self.name}' replica {replica.url} failed after the request was sent: {e}") from e
+            return status, response_headers, _decode_body(response_headers, data)
+
+        raise ServiceError(f"No reachable replica for '{self.name}': {last_error}")
+
+    def metrics(self) -> dict:
+        now = time.monotonic()
+        return {
+            replica.url: dict(replica.stats, idle_connections=replica.idle.qsize(), up=replica.down_until <= now)
+            for replica in self.replicas
+        }
+
+    def _replica_order(self) -> list:
+        """Replicas starting at the round-robin cursor; replicas in cooldown go last."""
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+        ordered = self.replicas[start:] + self.replicas[:start]
+        now = time.monotonic()
+        return [r for r in ordered if r.down_until <= now] + [r for r in ordered if r.down_until > now]
+
+    def _send(self, replica: _Replica, conn, method: str, path: str, body: bytes, headers: dict):
+        try:
+            conn.request(method, replica.base_path + path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except Exception:
+            conn.close()
+            raise
+
+        replica.count("requests")
+        if response.will_close:
+            conn.close()
+        else:
+            replica.release(conn)
+        return response.status, dict(response.getheaders()), data
+
+    def _mark_down(self, replica: _Replica, error: Exception):
+        replica.count("failures")
+        replica.down_until = time.monotonic() + self.cooldown
+        logger.warning("Service replica unreachable", service=self.name, replica=replica.url, error=str(error))
+
+
+def _is_dropped(conn) -> bool:
+    """Whether the server closed an idle connection: an idle HTTP socket only turns readable on EOF or error."""
+    if conn.sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+def _decode_body(headers: dict, data: bytes):
+    lowered = {key.lower(): value for key, value in headers.items()}
+    if "gzip" in lowered.get("content-encoding", ""):
+        data = gzip.decompress(data)
+    text = data.decode("utf-8")
+    if "application/json" in lowered.get("content-type", ""):
+        return json.loads(text)
+    return text
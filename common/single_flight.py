@@ -0,0 +1,112 @@
+import re
+import threading
+import time
+
+
+class _Call:
+    """An in-flight computation that duplicate callers wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls into one execution.
+
+    Callers with the same key that arrive while a call is in flight wait for it
+    and share its result (or exception). Results are then memoized for `ttl`
+    seconds so quick retries reuse them too.
+    """
+
+    def __init__(self, ttl: float = 30.0, cache_if=None):
+        """
+        Args:
+            ttl (float): Seconds a finished result is reused (0 disables the memo)
+            cache_if (callable): Optional predicate; only results it accepts are memoized
+        """
+        self.ttl = ttl
+        self.cache_if = cache_if
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._memo = {}
+        self._stats = {"calls": 0, "executions": 0, "coalesced": 0, "memo_hits": 0}
+
+    @staticmethod
+    def normalize_key(text) -> str:
+        """
+        Normalize request text so requests differing only in whitespace share a key.
+
+        Case is kept: paths, table names and endpoints in a request are case-sensitive.
+        """
+        return re.sub(r"\s+", " ", str(text)).strip()
+
+    def do(self, key: str, fn):
+        """
+        Run `fn()` once per key, sharing the result with concurrent and recent duplicates.
+
+        Args:
+            key (str): Coalescing key (usually from normalize_key)
+            fn (callable): Zero-argument function doing the real work
+
+        Returns:
+            The result of `fn()`; exceptions are re-raised to every waiter
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+            now = time.monotonic()
+
+            memo = self._memo.get(key)
+            if memo:
+                expires_at, result = memo
+                if expires_at > now:
+                    self._stats["memo_hits"] += 1
+                    return result
+                del self._memo[key]
+
+            call = self._in_flight.get(key)
+            if call:
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._in_flight[key] = call
+                self._stats["executions"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if call.error is None and self.ttl > 0 and (self.cache_if is None or self.cache_if(call.result)):
+                    self._memo[key] = (time.monotonic() + self.ttl, call.result)
+                self._evict_expired()
+            call.done.set()
+
+        if call.error:
+            raise call.error
+        return call.result
+
+    def metrics(self) -> dict:
+        """Return call, execution, coalesced and memo-hit counts."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._in_flight)
+            stats["memoized"] = len(self._memo)
+        return stats
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self._memo.items() if expires_at <= now]:
+            del self._memo[key]
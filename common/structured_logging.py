@@ -0,0 +1,226 @@
+"""
+Shared structured logging for the agents.
+
+Records are emitted as JSON lines by a background thread: callers only put
+the record on a bounded queue (dropping it if the queue is full), so the
+request path never waits on log I/O. Usage:
+
+    logger = get_logger("generator")
+    logger.info("DAG generated", dag_code=dag_code, attempt=2)
+
+Configuration (environment):
+    LOG_LEVEL            minimum level (default INFO)
+    LOG_SAMPLE_RATE      fraction of DEBUG/INFO records kept (default 1.0);
+                         warnings and errors are never sampled out
+    LOG_MAX_FIELD_CHARS  longer string fields are replaced by a hash, their
+                         length and a short preview (default 500)
+    LOG_FORMAT           "json" (default) or "text" for local debugging
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime
+
+# Fields that always hold large payloads; summarized whatever their length
+PAYLOAD_FIELDS = {"dag_code", "prompt", "response", "raw_output"}
+PREVIEW_CHARS = 120
+
+_configured = False
+_configure_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+
+
+def summarize(value, max_chars: int):
+    """Replace a large string by its hash, length and a preview; recurse into dicts and lists."""
+    if isinstance(value, str):
+        if len(value) <= max_chars:
+            return value
+        return {
+            "sha256": hashlib.sha256(value.encode("utf-8", "replace")).hexdigest()[:16],
+            "chars": len(value),
+            "preview": value[:PREVIEW_CHARS],
+        }
+    if isinstance(value, dict):
+        return {key: summarize(item, max_chars) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [summarize(item, max_chars) for item in value]
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: timestamp, level, logger, message, trace_id and fields."""
+
+    def __init__(self, max_field_chars: int = 500):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+        for key, value in (getattr(record, "fields", None) or {}).items():
+            if key in PAYLOAD_FIELDS and isinstance(value, str):
+                entry[key] = summarize(value, 0)
+            else:
+                entry[key] = summarize(value, self.max_field_chars)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(JsonFormatter):
+    """Human-readable variant of JsonFormatter, with the same payload summarizing."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = json.loads(super().format(record))
+        head = f"{entry.pop('ts')} {entry.pop('level'):<7} {entry.pop('logger')}: {entry.pop('message')}"
+        entry.pop("thread", None)
+        return f"{head} {json.dumps(entry, default=str)}" if entry else head
+
+
+class _SamplingFilter(logging.Filter):
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks and leaves formatting to the listener thread.
+
+    The stock handler formats (and so JSON-encodes payloads) in the caller's
+    thread; here the caller only resolves the message and exception text.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredLogger:
+    """Thin wrapper over a stdlib logger taking structured fields as keyword arguments."""
+
+    def __init__(self, logger: logging.Logger):
+        self._logger = logger
+
+    def debug(self, message: str, **fields):
+        self._log(logging.DEBUG, message, fields)
+
+    def info(self, message: str, **fields):
+        self._log(logging.INFO, message, fields)
+
+    def warning(self, message: str, **fields):
+        self._log(logging.WARNING, message, fields)
+
+    def error(self, message: str, **fields):
+        self._log(logging.ERROR, message, fields)
+
+    def exception(self, message: str, **fields):
+        self._log(logging.ERROR, message, fields, exc_info=True)
+
+    def is_enabled_for(self, level: int) -> bool:
+        return self._logger.isEnabledFor(level)
+
+    def _log(self, level: int, message: str, fields: dict, exc_info: bool = False):
+        if not self._logger.isEnabledFor(level):
+            return
+        # Imported lazily: tracing logs through this module too
+        from common.tracing import current_trace_id
+        self._logger.log(level, message, exc_info=exc_info,
+                         extra={"fields": fields, "trace_id": current_trace_id()})
+
+
+def configure_logging(level: str = None, sample_rate: float = None, max_field_chars: int = None,
+                      log_format: str = None, stream=None, max_queue: int = 10000):
+    """
+    Route the "mlops" logger tree through a bounded queue to a background writer.
+
+    Safe to call more than once; only the first call (or get_logger) configures.
+    """
+    global _configured, _listener, _queue_handler
+    with _configure_lock:
+        if _configured:
+            return
+        level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+        if sample_rate is None:
+            sample_rate = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+        if max_field_chars is None:
+            max_field_chars = int(os.getenv("LOG_MAX_FIELD_CHARS", "500"))
+        log_format = log_format or os.getenv("LOG_FORMAT", "json")
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        formatter_class = TextFormatter if log_format == "text" else JsonFormatter
+        output.setFormatter(formatter_class(max_field_chars))
+
+        _queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=max_queue))
+        _queue_handler.addFilter(_SamplingFilter(sample_rate))
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, output, respect_handler_level=False)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        root = logging.getLogger("mlops")
+        root.setLevel(getattr(logging, level, logging.INFO))
+        root.addHandler(_queue_handler)
+        root.propagate = False
+        _configured = True
+
+
+def _restart_listener_in_child():
+    """Threads don't survive fork(): give a forked worker its own queue and writer thread."""
+    if _listener is None:
+        return
+    fresh = queue.Queue(maxsize=_queue_handler.queue.maxsize)
+    _queue_handler.queue = fresh
+    _listener.queue = fresh
+    _listener._thread = None
+    _listener.start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listener_in_child)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """Structured logger for an agent or module, e.g. get_logger("parser")."""
+    configure_logging()
+    return StructuredLogger(logging.getLogger(f"mlops.{name}"))
+
+
+def logging_metrics() -> dict:
+    """Queue depth and records dropped because the log queue was full."""
+    if _queue_handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _queue_handler.queue.qsize(), "dropped": _queue_handler.dropped}
@@ -0,0 +1,382 @@
+import atexit
+import contextvars
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotation is not coordinated between processes
+    fcntl = None
+
+from common.structured_logging import get_logger
+
+logger = get_logger("tracing")
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# Trace and span ids accepted from another service's X-Trace-Id / X-Parent-Span-Id headers
+_REMOTE_ID_PATTERN = re.compile(r"[0-9a-f]{8,64}")
+
+
+class Span:
+    """One timed operation in a trace, with free-form attributes."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes", "started_at", "_start", "duration", "status", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, attributes: dict = None):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.started_at = datetime.now().isoformat()
+        self._start = time.perf_counter()
+        self.duration = None
+        self.status = "ok"
+        self.error = None
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class TraceStore:
+    """
+    Append-only JSONL store of finished spans.
+
+    Spans are queued and appended by a background thread, so finishing a span
+    only costs a queue put (a full queue drops the span and counts it). The
+    file is rotated to `<path>.1` once it passes `max_bytes`; only the current
+    file is indexed and served.
+
+    An in-memory index of byte offsets per trace id lets a single trace be
+    read without scanning the whole file. It covers the last `max_traces`
+    traces, is built from the file itself and is caught up with whatever was
+    appended since before every read, so spans written by other processes
+    sharing the file (prefork workers, the parser and generator services) are
+    found too.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024, max_traces: int = 10000,
+                 max_queue: int = 10000, batch_size: int = 200):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_traces = max_traces
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._offsets = OrderedDict()  # trace_id -> [byte offset, ...], oldest trace first
+        self._roots = deque(maxlen=max_traces)  # (trace_id, byte offset) of root spans, oldest first
+        self._indexed_to = 0  # bytes of the file already indexed
+        self._indexed_inode = None
+        self._writer_lock = threading.Lock()
+        self._writer_pid = None
+        self._queue = None
+        self._dropped = 0
+        self._written = 0
+
+    def append(self, span_dict: dict):
+        """Queue a finished span for the background writer."""
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(span_dict)
+        except queue.Full:
+            self._dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued span is written; returns False on timeout."""
+        if self._writer_pid != os.getpid():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def get_trace(self, trace_id: str) -> list:
+        """All spans of a trace, in the order they finished."""
+        self.flush(timeout=1.0)
+        with self._lock:
+            self._refresh_index()
+            offsets = list(self._offsets.get(trace_id, []))
+        return [span_dict for span_dict in self._read_at(offsets) if span_dict.get("trace_id") == trace_id]
+
+    def recent_traces(self, limit: int = 20) -> list:
+        """Root spans of the most recent traces, newest first."""
+        if limit < 1:
+            return []
+        self.flush(timeout=1.0)
+        with self._lock:
+            self._refresh_index()
+            offsets = [offset for _, offset in list(self._roots)[-limit:]]
+        return list(reversed(self._read_at(offsets)))
+
+    def metrics(self) -> dict:
+        with self._lock:
+            indexed = len(self._offsets)
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "written": self._written,
+            "dropped": self._dropped,
+            "indexed_traces": indexed,
+        }
+
+    def _ensure_writer(self):
+        # Threads don't survive fork(): a forked worker starts its own writer and queue
+        if self._writer_pid == os.getpid():
+            return
+        with self._writer_lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            threading.Thread(target=self._write_loop, args=(self._queue,), name="trace-writer", daemon=True).start()
+            self._writer_pid = os.getpid()
+
+    def _write_loop(self, span_queue: queue.Queue):
+        while True:
+            batch = [span_queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(span_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            spans = [item for item in batch if not isinstance(item, threading.Event)]
+            if spans:
+                data = b"".join((json.dumps(span_dict, default=str) + "\n").encode("utf-8") for span_dict in spans)
+                try:
+                    self._append_bytes(data)
+                    self._written += len(spans)
+                except OSError as e:
+                    self._dropped += len(spans)
+                    logger.error("Could not write trace spans", error=str(e), spans=len(spans))
+
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _append_bytes(self, data: bytes):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # One O_APPEND write per batch, so lines from concurrent processes never interleave
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size > self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        """Move the file to <path>.1 (replacing the previous one), once across processes sharing it."""
+        lock_fd = os.open(f"{self.path}.lock", os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            # Another process may have rotated while we waited for the lock
+            if os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+                logger.info("Rotated trace store", path=self.path)
+        except FileNotFoundError:
+            pass
+        finally:
+            os.close(lock_fd)
+
+    def _read_at(self, offsets: list) -> list:
+        spans = []
+        if not offsets:
+            return spans
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return spans
+        with f:
+            for offset in offsets:
+                f.seek(offset)
+                try:
+                    spans.append(json.loads(f.readline()))
+                except json.JSONDecodeError:
+                    continue  # the file was rotated since the index was read
+        return spans
+
+    def _index(self, span_dict: dict, offset: int):
+        trace_id = span_dict["trace_id"]
+        if trace_id not in self._offsets:
+            self._offsets[trace_id] = []
+            if len(self._offsets) > self.max_traces:
+                self._offsets.popitem(last=False)
+        self._offsets[trace_id].append(offset)
+        if span_dict.get("parent_id") is None:
+            self._roots.append((trace_id, offset))
+
+    def _refresh_index(self):
+        """Index the complete lines appended since the last call (caller holds the lock)."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+        if stat.st_ino != self._indexed_inode or stat.st_size < self._indexed_to:
+            # New or rotated file: start over
+            self._offsets.clear()
+            self._roots.clear()
+            self._indexed_to = 0
+            self._indexed_inode = stat.st_ino
+        if stat.st_size <= self._indexed_to:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._indexed_to)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # still being written
+                try:
+                    self._index(json.loads(line), self._indexed_to)
+                except (json.JSONDecodeError, KeyError):
+                    pass
+                self._indexed_to += len(line)
+
+
+_store = None
+_store_lock = threading.Lock()
+# Finished spans of traces still in progress, for timing summaries
+_open_traces = {}
+
+
+def get_trace_store() -> TraceStore:
+    """
+    Process-wide trace store at TRACE_STORE_PATH (default logs/traces.jsonl), rotated
+    past TRACE_STORE_MAX_BYTES (default 50 MB) and indexing the last TRACE_INDEX_MAX_TRACES.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TraceStore(
+                os.getenv("TRACE_STORE_PATH", os.path.join(PROJECT_ROOT, "logs", "traces.jsonl")),
+                max_bytes=int(os.getenv("TRACE_STORE_MAX_BYTES", str(50 * 1024 * 1024))),
+                max_traces=int(os.getenv("TRACE_INDEX_MAX_TRACES", "10000")),
+            )
+            # Give queued spans a chance to land before the interpreter exits
+            atexit.register(_store.flush)
+        return _store
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time the enclosed block as a span.
+
+    Nested inside another span it becomes a child of it; otherwise it starts a
+    new trace. Exceptions mark the span as failed and are re-raised.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        current = Span(name, uuid.uuid4().hex, attributes=attributes)
+        with _store_lock:
+            _open_traces[current.trace_id] = []
+    else:
+        current = Span(name, parent.trace_id, parent.span_id, attributes)
+
+    with _activate(current, is_root=parent is None):
+        yield current
+
+
+@contextmanager
+def continue_trace(name: str, trace_id: str = None, parent_id: str = None, **attributes):
+    """
+    Time the enclosed block as a span of a trace started by another service.
+
+    `trace_id` and `parent_id` come from the caller's X-Trace-Id and
+    X-Parent-Span-Id headers (see common/service_client.py); the span and its
+    children join that trace. Without a valid trace id this is span(name).
+    """
+    if not trace_id or not _REMOTE_ID_PATTERN.fullmatch(trace_id):
+        with span(name, **attributes) as current:
+            yield current
+        return
+    if parent_id and not _REMOTE_ID_PATTERN.fullmatch(parent_id):
+        parent_id = None
+
+    current = Span(name, trace_id, parent_id, attributes)
+    # Not a local root: the caller's process owns the trace's timing summary
+    with _activate(current, is_root=False):
+        yield current
+
+
+@contextmanager
+def _activate(current: Span, is_root: bool):
+    token = _current_span.set(current)
+    try:
+        yield
+    except BaseException as e:
+        current.status = "error"
+        current.error = str(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.duration = round(time.perf_counter() - current._start, 4)
+        _finish(current, is_root=is_root)
+
+
+def set_attribute(key: str, value):
+    """Set an attribute on the current span, if there is one."""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes[key] = value
+
+
+def current_trace_id():
+    current = _current_span.get()
+    return current.trace_id if current else None
+
+
+def current_span_id():
+    current = _current_span.get()
+    return current.span_id if current else None
+
+
+def timing_summary(trace_id: str) -> dict:
+    """
+    Seconds per top-level stage of a trace still in progress, plus LLM call stats.
+
+    Stages are the direct children of the root span; repeated stages are summed.
+    """
+    with _store_lock:
+        spans = list(_open_traces.get(trace_id, []))
+    root_ids = {s.parent_id for s in spans if s.parent_id is not None} - {s.span_id for s in spans}
+    stages = {}
+    llm_calls, llm_seconds = 0, 0.0
+    for finished in spans:
+        if finished.parent_id in root_ids:
+            stages[finished.name] = round(stages.get(finished.name, 0.0) + finished.duration, 3)
+        if finished.name.startswith("llm."):
+            llm_calls += 1
+            llm_seconds += finished.duration
+    return {"stages": stages, "llm_calls": llm_calls, "llm_seconds": round(llm_seconds, 3)}
+
+
+def _finish(finished: Span, is_root: bool):
+    with _store_lock:
+        if is_root:
+            _open_traces.pop(finished.trace_id, None)
+        elif finished.trace_id in _open_traces:
+            _open_traces[finished.trace_id].append(finished)
+    get_trace_store().append(finished.to_dict())
@@ -1,7 +1,34 @@
+import os
 from flask import Flask, request, jsonify
-from controller import run_flow
+from controller import run_flow, CONTROLLER_MODE
+from common.single_flight import SingleFlight
+from common.llm_scheduler import get_scheduler
+from common.resilience import resilience_metrics
+from common.tracing import get_trace_store
+from common.model_router import get_router
+from common.history_store import get_history_store
+from common.structured_logging import logging_metrics
+from common.http_compression import enable_gzip
+from controller_app.remote_stages import remote_metrics
+from common.assets import asset_metrics
+from common.prefork import serve
 
 app = Flask(__name__)
+enable_gzip(app)
+
+# Identical concurrent /flow requests share one run; successful results are reused briefly
+flow_flight = SingleFlight(
+    ttl=float(os.getenv("FLOW_MEMO_TTL", "30")),
+    cache_if=lambda result: result.get("status") == "success"
+)
+
+# Upper bound for the ?limit of the trace and history listings
+MAX_LIST_LIMIT = int(os.getenv("MAX_LIST_LIMIT", "200"))
+
+def _limit_arg(default: int = 20) -> int:
+    """The ?limit query argument clamped to 1..MAX_LIST_LIMIT."""
+    limit = request.args.get('limit', default=default, type=int)
+    return min(max(limit, 1), MAX_LIST_LIMIT)
 
 @app.route('/flow', methods=['POST'])
 def flow_endpoint():
@@ -12,16 +39,68 @@ def flow_endpoint():
             return jsonify({'error': 'Missing required field: req'}), 400
         
         req_value = data['req']
-        result = run_flow(req_value)
+        result = flow_flight.do(SingleFlight.normalize_key(req_value), lambda: run_flow(req_value))
         
         return jsonify(result), 200 if result["status"] == "success" else 500
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'flow_coalescing': flow_flight.metrics(),
+        'llm_scheduler': get_scheduler().metrics(),
+        'llm_resilience': resilience_metrics(),
+        'logging': logging_metrics(),
+        'controller_mode': CONTROLLER_MODE,
+        'remote_services': remote_metrics(),
+        'assets': asset_metrics(),
+        'trace_store': get_trace_store().metrics(),
+        'model_routing': get_router().metrics()
+    }), 200
+
+@app.route('/traces', methods=['GET'])
+def list_traces():
+    return jsonify({'traces': get_trace_store().recent_traces(_limit_arg())}), 200
+
+@app.route('/traces/<trace_id>', methods=['GET'])
+def get_trace(trace_id):
+    spans = get_trace_store().get_trace(trace_id)
+    if not spans:
+        return jsonify({'error': f'Trace not found: {trace_id}'}), 404
+    return jsonify({'trace_id': trace_id, 'spans': spans}), 200
+
+@app.route('/history/flows', methods=['GET'])
+def list_flows():
+    flows = get_history_store().recent_flows(
+        limit=_limit_arg(),
+        status=request.args.get('status'),
+        dag_id=request.args.get('dag_id'),
+        request_hash=request.args.get('request_hash')
+    )
+    return jsonify({'flows': flows}), 200
+
+@app.route('/history/flows/<flow_id>', methods=['GET'])
+def get_flow(flow_id):
+    flow = get_history_store().get_flow(flow_id)
+    if flow is None:
+        return jsonify({'error': f'Flow not found: {flow_id}'}), 404
+    return jsonify(flow), 200
+
+@app.route('/history/stats', methods=['GET'])
+def history_stats():
+    store = get_history_store()
+    since = request.args.get('since')
+    return jsonify({
+        'pass_rate_by_source_type': store.pass_rate_by_source_type(since),
+        'avg_attempts_by_shape': store.avg_attempts_by_shape(since),
+        'writer': store.metrics()
+    }), 200
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy'}), 200
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=8002)
+    serve(app, host='0.0.0.0', port=8002, debug=True)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Batch flow runner: run_flow over a JSONL file of requests.
+
+Each input line is a JSON object with the request text in `req` (or `body`),
+and optionally a `request_id`. Flows run with bounded concurrency; each result
+is appended to the output JSONL as soon as it finishes, and completed ids are
+checkpointed so a crashed run resumes where it stopped.
+
+Usage:
+    python batch_runner.py requests.jsonl results.jsonl --concurrency 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from controller import run_flow
+from common.llm_scheduler import llm_priority, BATCH
+
+
+def read_requests(input_path):
+    """Stream (request_id, request_text) pairs from a JSONL file."""
+    with open(input_path, "r") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping line {line_number}: invalid JSON ({e})")
+                continue
+            if isinstance(record, str):
+                record = {"req": record}
+            req = record.get("req") or record.get("body")
+            if not req:
+                print(f"Skipping line {line_number}: no 'req' or 'body' field")
+                continue
+            yield str(record.get("request_id") or f"line-{line_number}"), req
+
+
+def load_checkpoint(checkpoint_path):
+    """Return the set of request ids already completed."""
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path, "r") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+class BatchStats:
+    """Thread-safe throughput, error-rate and per-stage timing counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start = time.monotonic()
+        self.completed = 0
+        self.failed = 0
+        self.stage_times = {}
+
+    def record(self, result):
+        with self._lock:
+            self.completed += 1
+            if result.get("status") != "success":
+                self.failed += 1
+            for stage, seconds in result.get("timings", {}).items():
+                self.stage_times.setdefault(stage, []).append(seconds)
+
+    def progress_line(self):
+        with self._lock:
+            elapsed = time.monotonic() - self.start
+            rate = self.completed / elapsed * 60 if elapsed else 0.0
+            error_rate = self.failed / self.completed if self.completed else 0.0
+            return (f"[{elapsed:7.1f}s] done={self.completed} failed={self.failed} "
+                    f"error_rate={error_rate:.1%} throughput={rate:.1f}/min")
+
+    def summary(self):
+        with self._lock:
+            elapsed = time.monotonic() - self.start
+            stages = {}
+            for stage, values in self.stage_times.items():
+                ordered = sorted(values)
+                stages[stage] = {
+                    "count": len(ordered),
+                    "avg": round(sum(ordered) / len(ordered), 3),
+                    "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                    "max": ordered[-1],
+                }
+            return {
+                "completed": self.completed,
+                "failed": self.failed,
+                "error_rate": round(self.failed / self.completed, 4) if self.completed else 0.0,
+                "elapsed_seconds": round(elapsed, 3),
+                "throughput_per_minute": round(self.completed / elapsed * 60, 2) if elapsed else 0.0,
+                "stages": stages,
+            }
+
+
+def run_batch(input_path, output_path, concurrency=4, checkpoint_path=None, flow_fn=run_flow):
+    """
+    Run flows for every request in a JSONL file.
+
+    Args:
+        input_path (str): JSONL file of requests
+        output_path (str): JSONL file results are appended to
+        concurrency (int): Max flows running at once
+        checkpoint_path (str): File of completed request ids (default: <output_path>.checkpoint)
+        flow_fn (callable): Flow to run per request (default: controller.run_flow)
+
+    Returns:
+        dict: Summary with counts, error rate, throughput and per-stage timings
+    """
+    checkpoint_path = checkpoint_path or f"{output_path}.checkpoint"
+    done_ids = load_checkpoint(checkpoint_path)
+    if done_ids:
+        print(f"Resuming: {len(done_ids)} requests already completed")
+
+    stats = BatchStats()
+    write_lock = threading.Lock()
+    # Bounds how far reading runs ahead of the workers, so huge inputs stream
+    slots = threading.BoundedSemaphore(concurrency * 2)
+
+    with open(output_path, "a") as output_file, open(checkpoint_path, "a") as checkpoint_file:
+
+        def process(request_id, req):
+            try:
+                try:
+                    # Batch flows queue behind interactive /flow calls for LLM quota
+                    with llm_priority(BATCH):
+                        result = flow_fn(req)
+                except Exception as e:
+                    result = {"status": "failed", "error": str(e)}
+
+                with write_lock:
+                    # Result first, then checkpoint: a crash in between re-runs the request
+                    output_file.write(json.dumps({"request_id": request_id, "req": req, "result": result}) + "\n")
+                    output_file.flush()
+                    checkpoint_file.write(request_id + "\n")
+                    checkpoint_file.flush()
+
+                stats.record(result)
+                print(f"{stats.progress_line()} last={request_id} ({result.get('status')})")
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for request_id, req in read_requests(input_path):
+                if request_id in done_ids:
+                    continue
+                slots.acquire()
+                pool.submit(process, request_id, req)
+
+    summary = stats.summary()
+    print("Batch summary:")
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Run the MLOps flow over a JSONL file of requests")
+    arg_parser.add_argument("input", help="JSONL file with one request per line")
+    arg_parser.add_argument("output", help="JSONL file to append results to")
+    arg_parser.add_argument("--concurrency", type=int, default=4, help="Max flows running at once")
+    arg_parser.add_argument("--checkpoint", help="Checkpoint file (default: <output>.checkpoint)")
+    args = arg_parser.parse_args()
+
+    summary = run_batch(args.input, args.output, args.concurrency, args.checkpoint)
+    sys.exit(1 if summary["completed"] and summary["failed"] == summary["completed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Cold-start import benchmark for the services and CLIs.
+
+Imports each service module in a fresh interpreter several times and
+compares the median import time with a budget. It also fails if importing
+a module loads the LangChain/Gemini stack, which is meant to be imported on
+the first LLM call (see common/assets.py). Exits with status 1 on any
+regression, so it can gate CI or a container build.
+
+** This file is for testing only **
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (directory the service runs from, module, import budget in seconds)
+TARGETS = {
+    "controller": ("controller_app", "controller", 0.3),
+    "controller_app": ("controller_app", "app", 0.5),
+    "parser_app": ("parser_agent", "app", 0.5),
+    "generator_app": ("pipeline_generator_agent", "app", 0.5),
+    "validator": ("validation_agent", "dag_validator", 0.1),
+}
+
+# Modules that must not be loaded by importing a service
+LAZY_MODULES = ("langchain", "langchain_core", "langchain_google_genai", "google.generativeai")
+
+MARKER = "COLD_START_RESULT "
+
+# Run in the fresh interpreter: import the module from its service directory, as `python app.py` would
+PROBE = """
+import importlib, json, sys, time
+sys.path.insert(0, sys.argv[1])
+started = time.perf_counter()
+importlib.import_module(sys.argv[2])
+seconds = time.perf_counter() - started
+lazy = [name for name in sys.argv[3].split(",") if name in sys.modules]
+print({marker!r} + json.dumps({{"seconds": seconds, "loaded": lazy}}), flush=True)
+""".format(marker=MARKER)
+
+
+def measure(directory: str, module: str) -> dict:
+    """Import time (seconds) and eagerly loaded LLM modules for one fresh-interpreter import."""
+    env = dict(os.environ, LOG_LEVEL="WARNING", PYTHONDONTWRITEBYTECODE="1")
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE, os.path.join(PROJECT_ROOT, directory), module, ",".join(LAZY_MODULES)],
+        cwd=os.path.join(PROJECT_ROOT, directory),
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120
+    )
+    for line in completed.stdout.splitlines():
+        if line.startswith(MARKER):
+            return json.loads(line[len(MARKER):])
+    raise RuntimeError(f"Importing {module} from {directory} failed:\n{completed.stderr.strip()}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per target (median is compared)")
+    arg_parser.add_argument("--budget-scale", type=float, default=float(os.getenv("COLD_START_BUDGET_SCALE", "1.0")),
+                            help="Multiply every budget, e.g. 2 on a slow CI runner")
+    arg_parser.add_argument("--only", nargs="*", choices=sorted(TARGETS), help="Benchmark only these targets")
+    arg_parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = arg_parser.parse_args()
+
+    results = {}
+    failures = []
+    for name in args.only or TARGETS:
+        directory, module, budget = TARGETS[name]
+        budget *= args.budget_scale
+        runs = [measure(directory, module) for _ in range(args.runs)]
+        median = statistics.median(run["seconds"] for run in runs)
+        loaded = sorted({module_name for run in runs for module_name in run["loaded"]})
+        results[name] = {"median_seconds": round(median, 4), "budget_seconds": round(budget, 4), "eager_llm_modules": loaded}
+        if median > budget:
+            failures.append(f"{name}: median import {median:.3f}s exceeds budget {budget:.3f}s")
+        if loaded:
+            failures.append(f"{name}: importing loads {', '.join(loaded)} (should be lazy)")
+
+    if args.json:
+        print(json.dumps({"results": results, "failures": failures}, indent=2))
+    else:
+        for name, result in results.items():
+            status = "ok" if not any(failure.startswith(f"{name}:") for failure in failures) else "FAIL"
+            print(f"{name:<16} {result['median_seconds'] * 1000:8.1f} ms  (budget {result['budget_seconds'] * 1000:.0f} ms)  {status}")
+        for failure in failures:
+            print(f"FAIL {failure}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,115 @@
 import sys
 import os
+import hashlib
+import re
+from contextlib import contextmanager
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from parser_agent.parser_agent import parse_request
+from parser_agent.spec_validator import validate_spec
 from pipeline_generator_agent.integration_agent import IntegrationAgent
 from validation_agent.dag_validator import DAGValidator
 from deployment_agent.deployment_agent import DeploymentAgent
+from common.dag_library import get_library
+from common.tracing import span, timing_summary, current_trace_id
+from common.history_store import get_history_store
+from common.model_router import spec_hash, spec_shape
+from common.single_flight import SingleFlight
+from controller_app.remote_stages import remote_parse, remote_generate
+
+# "local" runs the parser and generator in-process; "remote" calls their services
+CONTROLLER_MODE = os.getenv("CONTROLLER_MODE", "local")
+
+@contextmanager
+def _timed(timings, stage):
+    """Trace a flow stage as a span and record its wall-clock seconds."""
+    stage_span = None
+    try:
+        with span(stage) as stage_span:
+            yield
+    finally:
+        if stage_span is not None and stage_span.duration is not None:
+            timings[stage] = round(stage_span.duration, 3)
 
 def run_flow(req):
     """
     Run the MLOps pipeline flow
+    
+    Every flow is traced; the response always includes per-stage `timings`
+    in seconds and a `trace` summary (trace_id and LLM call totals).
+    """
+    timings = {}
+    history = {}
+    with span("flow", request_chars=len(str(req))) as flow_span:
+        response = _run_stages(req, timings, history)
+        flow_span.attributes["status"] = response["status"]
+        summary = timing_summary(flow_span.trace_id)
+    
+    timings["total"] = round(flow_span.duration, 3)
+    _record_flow(flow_span, req, response, history)
+    response["timings"] = timings
+    response["trace"] = {
+        "trace_id": flow_span.trace_id,
+        "llm_calls": summary["llm_calls"],
+        "llm_seconds": summary["llm_seconds"]
+    }
+    return response
+
+def _record_flow(flow_span, req, response, history):
+    """Queue the flow outcome for the history store (the trace id is the flow id)."""
+    parsed_result = history.get("spec")
+    source = (parsed_result or {}).get("source")
+    get_history_store().record_flow(
+        flow_id=flow_span.trace_id,
+        created_at=flow_span.started_at,
+        request_hash=hashlib.sha256(SingleFlight.normalize_key(req).encode()).hexdigest()[:16],
+        request=str(req),
+        status=response["status"],
+        error=response.get("error"),
+        dag_id=history.get("dag_id"),
+        spec_hash=spec_hash(parsed_result) if parsed_result else None,
+        source_type=str(source.get("type", "unknown")).lower() if isinstance(source, dict) else None,
+        spec_shape=spec_shape(parsed_result) if parsed_result else None,
+        attempts=history.get("attempts"),
+        judge_score=history.get("judge_score"),
+        duration=flow_span.duration
+    )
+
+def _run_stages(req, timings, history):
+    """
+    Run the flow stages, recording each stage's duration in `timings`
+    and what the history store needs in `history`
     """
     try:
         # 1. Parse the request
-        parsed_result = parse_request(req)
+        with _timed(timings, "parse"):
+            parsed_result = remote_parse(req) if CONTROLLER_MODE == "remote" else parse_request(req)
         
         # 2. Check if parsing had errors
         if "error" in parsed_result:
             return {"status": "failed", "error": parsed_result["error"]}
         
+        # Gate the spec before any generator/judge calls are spent on it
+        validation = validate_spec(parsed_result, req)
+        if not validation["valid"]:
+            return {
+                "status": "failed",
+                "error": f"Parsed specification is invalid: {'; '.join(validation['errors'])}",
+                "validation_errors": validation["errors"]
+            }
+        parsed_result = validation["spec"]
+        history["spec"] = parsed_result
+        
         # 3. Generate and validate pipeline
-        integration = IntegrationAgent()
-        result = integration.generate_and_validate_pipeline(parsed_result)
+        integration = IntegrationAgent(generator=remote_generate if CONTROLLER_MODE == "remote" else None)
+        with _timed(timings, "generate"):
+            result = integration.generate_and_validate_pipeline(parsed_result)
+        history["attempts"] = result.get("attempt")
+        history["judge_score"] = result.get("evaluation", {}).get("score")
+        dag_id_match = re.search(r"dag_id\s*=\s*['\"]([^'\"]+)['\"]", result.get("dag_code") or "")
+        history["dag_id"] = dag_id_match.group(1) if dag_id_match else None
         
         # 4. Check if pipeline generation was successful
         if not result["success"]:
@@ -31,14 +117,25 @@ def run_flow(req):
         
         # 5. Save the generated DAG to file first (for validation)
         try:
-            saved_file_path = integration.save_final_dag(result["dag_code"])
+            with _timed(timings, "save"):
+                saved_file_path = integration.save_final_dag(result["dag_code"])
         except Exception as save_error:
             return {"status": "failed", "error": f"Pipeline generated but failed to save: {str(save_error)}"}
         
         # 6. Validate the generated DAG using the validation agent
         validator = DAGValidator()
         dag_filename = os.path.basename(saved_file_path)
-        validation_result = validator.validate_dag(dag_filename)
+        with _timed(timings, "validate"):
+            validation_result = validator.validate_dag(dag_filename)
+        get_history_store().record_validation(
+            flow_id=current_trace_id(),
+            dag_id=history["dag_id"],
+            filename=dag_filename,
+            success=validation_result["success"],
+            errors=validation_result.get("errors"),
+            warnings=validation_result.get("warnings"),
+            parse_time=validation_result.get("parse_time")
+        )
         
         # 7. Check validation results
         if not validation_result["success"]:
@@ -50,15 +147,31 @@ def run_flow(req):
         
         # 8. Deploy to Airflow
         deployment_agent = DeploymentAgent()
-        deployment_agent.deploy_file(os.path.basename(saved_file_path), "move")
+        with _timed(timings, "deploy"):
+            deployment_agent.deploy_file(
+                os.path.basename(saved_file_path),
+                "move",
+                metadata={
+                    "spec_hash": spec_hash(parsed_result),
+                    "judge_score": result.get("evaluation", {}).get("score"),
+                    "validation": {
+                        "success": validation_result["success"],
+                        "warnings": validation_result.get("warnings", [])
+                    }
+                }
+            )
+        
+        # 9. Remember the approved DAG for reuse and few-shot examples
+        get_library().add(parsed_result, result["dag_code"], result.get("evaluation", {}).get("score"))
         
-        # 9. Return success with validation info
+        # 10. Return success with validation info
         response = {
             "status": "success",
             "saved_file": deployment_agent.get_deployed_path(os.path.basename(saved_file_path)),
             "validation": {
                 "success": validation_result["success"],
-                "warnings": validation_result.get("warnings", [])
+                "warnings": validation_result.get("warnings", []),
+                "task_graph": validation_result.get("task_graph")
             }
         }
         
@@ -0,0 +1,101 @@
+"""
+Remote execution of the LLM stages for CONTROLLER_MODE=remote.
+
+The parser and generator run as their own services (parser_agent/app.py,
+pipeline_generator_agent/app.py), possibly with several replicas each:
+
+    PARSER_SERVICE_URLS=http://parser-1:8001,http://parser-2:8001
+    GENERATOR_SERVICE_URLS=http://generator-1:5001,http://generator-2:5001
+
+Calls go through pooled keep-alive clients with gzip payloads and
+round-robin load balancing (common/service_client.py).
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+from common.service_client import ServiceClient, ServiceError
+from common.llm_scheduler import RateLimitError
+from common.resilience import CircuitOpenError, DeadlineExceededError
+from common.dag_library import get_library
+
+PARSER_TIMEOUT = float(os.getenv("REMOTE_PARSER_TIMEOUT", "90"))
+GENERATOR_TIMEOUT = float(os.getenv("REMOTE_GENERATOR_TIMEOUT", "240"))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _client(name: str, variable: str, timeout: float) -> ServiceClient:
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = ServiceClient.from_env(name, variable, timeout=timeout)
+        return _clients[name]
+
+
+def remote_parse(request: str) -> dict:
+    """
+    Parse a request on a parser service replica.
+
+    Returns the parsed spec, or an error dict shaped like parse_request's.
+    """
+    try:
+        status, body = _client("parser", "PARSER_SERVICE_URLS", PARSER_TIMEOUT).post_json("/parse", {"req": request})
+    except ServiceError as e:
+        return _parse_error(request, str(e), "upstream_unavailable")
+
+    if status != 200 or not isinstance(body, dict) or "parsed_result" not in body:
+        message = body.get("error") if isinstance(body, dict) else str(body)[:200]
+        return _parse_error(request, f"Parser service returned {status}: {message}", "upstream_error")
+    return body["parsed_result"]
+
+
+def remote_generate(pipeline_spec: dict) -> str:
+    """
+    Generate a DAG on a generator service replica.
+
+    A DAG the service reused from its library is marked in this process's
+    library too, so the integration agent treats it as reused (see reuse_info).
+
+    Raises:
+        RateLimitError: the generator service is rate limited (429)
+        CircuitOpenError: the generator service's LLM upstream is degraded (503)
+        DeadlineExceededError: the generator's LLM call missed its deadline (504)
+        ServiceError: no generator replica is reachable
+    """
+    status, headers, body = _client("generator", "GENERATOR_SERVICE_URLS", GENERATOR_TIMEOUT).post(
+        "/generate", {"pipeline_spec": pipeline_spec, "save_to_file": False}
+    )
+    if status == 200 and isinstance(body, str):
+        reuse = {key.lower(): value for key, value in headers.items()}.get("x-dag-reuse")
+        if reuse:
+            get_library().mark_reused(body, json.loads(reuse))
+        return body
+
+    message = body.get("error") if isinstance(body, dict) else str(body)[:200]
+    if status == 429:
+        raise RateLimitError(message)
+    if status == 503:
+        raise CircuitOpenError(message)
+    if status == 504:
+        raise DeadlineExceededError(message)
+    raise RuntimeError(f"Generator service returned {status}: {message}")
+
+
+def remote_metrics() -> dict:
+    """Per-replica request, failure and connection-pool stats of the clients used so far."""
+    with _clients_lock:
+        clients = dict(_clients)
+    return {name: client.metrics() for name, client in clients.items()}
+
+
+def _parse_error(request: str, message: str, error_type: str) -> dict:
+    return {
+        "status": "error",
+        "original_request": request,
+        "error": message,
+        "error_type": error_type,
+        "timestamp": datetime.now().isoformat()
+    }
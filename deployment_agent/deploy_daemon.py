@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Run the DeploymentAgent as a long-running deploy daemon.
+
+Watches the pipeline generator output directory and promotes new or changed,
+valid DAGs to the Airflow DAGs directory. DAGs already in the output directory
+when the daemon starts are validated and deployed first.
+"""
+
+import argparse
+import os
+import sys
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from deployment_agent.deployment_agent import DeploymentAgent
+except ImportError:
+    # Run from this directory, where "deployment_agent" is deployment_agent.py itself
+    from deployment_agent import DeploymentAgent
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Auto-deploy generated DAGs to Airflow")
+    arg_parser.add_argument("--source-dir", help="Directory to watch (default: pipeline_generator_agent/output)")
+    arg_parser.add_argument("--target-dir", help="Airflow DAGs directory (default: airflow/dags)")
+    arg_parser.add_argument("--debounce", type=float, default=1.0, help="Quiet seconds before deploying a batch")
+    arg_parser.add_argument("--poll-interval", type=float, default=1.0, help="Polling interval when inotify is unavailable")
+    args = arg_parser.parse_args()
+
+    agent = DeploymentAgent(source_dir=args.source_dir, target_dir=args.target_dir)
+    agent.watch(debounce=args.debounce, poll_interval=args.poll_interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # not on POSIX: only in-process locking
+    fcntl = None
+
+from common.structured_logging import get_logger
+
+logger = get_logger("deploy_registry")
+
+DAG_ID_PATTERN = re.compile(r"dag_id\s*=\s*['\"]([^'\"]+)['\"]")
+
+
+@contextmanager
+def file_lock(lock_path):
+    """Exclusive advisory lock on `lock_path`, held across processes (flock) for the with-block."""
+    with open(lock_path, "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class DeployRegistry:
+    """
+    Versioned record of deployed DAGs.
+
+    Every deploy and rollback is appended to deploy_log.jsonl and replayed into
+    in-memory indexes, so looking up the live version or any past version of a
+    DAG is a dict/list lookup. DAG contents are kept once per content hash as
+    gzip files under versions/.
+
+    Use get_registry() for one shared instance per process. Other processes
+    (the batch runner, the deploy daemon) append to the same log: every call
+    first applies entries appended since the last read, and new versions are
+    numbered while holding a lock file, so version numbers stay unique.
+    """
+
+    def __init__(self, registry_dir):
+        self.registry_dir = Path(registry_dir)
+        self.versions_dir = self.registry_dir / "versions"
+        self.log_path = self.registry_dir / "deploy_log.jsonl"
+        self.lock_path = self.registry_dir / "deploy_log.lock"
+        self.versions_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._versions = {}  # dag_id -> [version record, ...] (index = version - 1)
+        self._live = {}      # dag_id -> live version number
+        self._offset = 0     # bytes of deploy_log.jsonl already applied
+        self._needs_newline = False
+        with self._lock:
+            self._load()
+
+    def record_deploy(self, filename, content, spec_hash=None, judge_score=None, validation=None):
+        """
+        Record a deployed DAG file as a new version of its DAG.
+
+        Args:
+            filename (str): Deployed filename
+            content (bytes): Deployed file content
+            spec_hash (str): model_router.spec_hash of the pipeline spec the DAG was generated from
+                (the same key the flow history and routing log use)
+            judge_score (float): Judge score of the generated DAG
+            validation (dict): Validation result (success and warnings)
+
+        Returns:
+            dict: The version record (the existing one if the content is already live)
+        """
+        dag_id = self.extract_dag_id(content, filename)
+        content_hash = hashlib.sha256(content).hexdigest()
+
+        with self._lock, file_lock(self.lock_path):
+            self._load(locked=True)
+            live = self._get_live_record(dag_id)
+            if live and live["content_hash"] == content_hash and live["filename"] == filename:
+                return live
+
+            self._store_blob(content_hash, content)
+            record = {
+                "event": "deploy",
+                "dag_id": dag_id,
+                "version": len(self._versions.get(dag_id, [])) + 1,
+                "filename": filename,
+                "content_hash": content_hash,
+                "spec_hash": spec_hash,
+                "judge_score": judge_score,
+                "validation": validation,
+                "deployed_at": datetime.now().isoformat(),
+            }
+            self._append(record)
+            self._apply(record)
+            return record
+
+    def record_rollback(self, dag_id, version):
+        """Mark an existing version of a DAG as live again."""
+        with self._lock, file_lock(self.lock_path):
+            self._load(locked=True)
+            record = {
+                "event": "rollback",
+                "dag_id": dag_id,
+                "version": version,
+                "deployed_at": datetime.now().isoformat(),
+            }
+            self._append(record)
+            self._apply(record)
+
+    def get_live(self, dag_id):
+        """Return the live version record for a DAG, or None."""
+        with self._lock:
+            self._load()
+            return self._get_live_record(dag_id)
+
+    def get_version(self, dag_id, version):
+        """Return a specific version record for a DAG, or None."""
+        with self._lock:
+            self._load()
+            versions = self._versions.get(dag_id, [])
+            if 1 <= version <= len(versions):
+                return versions[version - 1]
+            return None
+
+    def list_versions(self, dag_id):
+        """Return all version records for a DAG, oldest first."""
+        with self._lock:
+            self._load()
+            return list(self._versions.get(dag_id, []))
+
+    def list_live(self):
+        """Return the live version record of every deployed DAG."""
+        with self._lock:
+            self._load()
+            return {dag_id: self._get_live_record(dag_id) for dag_id in self._live}
+
+    def read_content(self, record):
+        """Return the stored file content of a version record."""
+        with gzip.open(self._blob_path(record["content_hash"]), "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def extract_dag_id(content, filename):
+        """Extract the dag_id from DAG code, falling back to the filename stem."""
+        match = DAG_ID_PATTERN.search(content.decode("utf-8", errors="replace"))
+        return match.group(1) if match else Path(filename).stem
+
+    def _get_live_record(self, dag_id):
+        version = self._live.get(dag_id)
+        return self._versions[dag_id][version - 1] if version else None
+
+    def _apply(self, record):
+        if record["event"] == "deploy":
+            self._versions.setdefault(record["dag_id"], []).append(record)
+        self._live[record["dag_id"]] = record["version"]
+
+    def _append(self, record):
+        """Append a record; called with the lock file held, right after _load(locked=True)."""
+        data = json.dumps(record) + "\n"
+        if self._needs_newline:
+            data = "\n" + data
+            self._needs_newline = False
+        encoded = data.encode("utf-8")
+        with open(self.log_path, "ab") as f:
+            f.write(encoded)
+            f.flush()
+            os.fsync(f.fileno())
+        self._offset += len(encoded)
+
+    def _load(self, locked=False):
+        """
+        Apply log entries appended since the last read, by this or another process.
+
+        A trailing line without a newline is normally still being written and is
+        left for the next call; with the lock file held (`locked`) nobody is
+        writing, so it is a torn line from a crash and is skipped.
+        """
+        try:
+            if self.log_path.stat().st_size <= self._offset:
+                return
+        except FileNotFoundError:
+            return
+        with open(self.log_path, "rb") as f:
+            f.seek(self._offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    if locked:
+                        logger.warning("Skipping torn deploy log entry", entry=raw.decode("utf-8", errors="replace"))
+                        self._offset += len(raw)
+                        self._needs_newline = True
+                    break
+                self._offset += len(raw)
+                line = raw.decode("utf-8", errors="replace").strip()
+                if not line:
+                    continue
+                try:
+                    self._apply(json.loads(line))
+                except (json.JSONDecodeError, KeyError):
+                    # A torn line from a crash is skipped, not fatal
+                    logger.warning("Skipping unreadable deploy log entry", entry=line)
+
+    def _blob_path(self, content_hash):
+        return self.versions_dir / f"{content_hash}.py.gz"
+
+    def _store_blob(self, content_hash, content):
+        blob_path = self._blob_path(content_hash)
+        if blob_path.exists():
+            return
+        temp_path = blob_path.with_suffix(".tmp")
+        with gzip.open(temp_path, "wb") as f:
+            f.write(content)
+        os.replace(temp_path, blob_path)
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(registry_dir) -> DeployRegistry:
+    """Process-wide registry for a directory, shared by every DeploymentAgent in the process."""
+    key = str(Path(registry_dir).resolve())
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = DeployRegistry(registry_dir)
+        return _registries[key]
@@ -1,48 +1,91 @@
+import hashlib
+import json
+import os
 import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
+# Add parent directory to path for shared modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from deployment_agent.deploy_registry import get_registry, file_lock
+except ImportError:
+    # Run as a script from this directory, where "deployment_agent" is this module
+    from deploy_registry import get_registry, file_lock
+from validation_agent.dag_validator import DAGValidator
+from common.structured_logging import get_logger
+
+logger = get_logger("deployment")
+
+# Records what sync_dags last wrote, kept next to the deployed DAGs
+MANIFEST_FILENAME = ".deploy_manifest.json"
+
+# Serializes manifest read-modify-write between threads; file_lock covers other processes
+_manifest_lock = threading.Lock()
+
 class DeploymentAgent:
     """Simple deployment agent that copies or moves files."""
     
-    def __init__(self, source_dir=None, target_dir=None):
-        # Set paths - use provided paths or defaults
-        if source_dir and target_dir:
-            self.source_dir = Path(source_dir)
-            self.target_dir = Path(target_dir)
-        else:
-            # Default paths relative to project root
-            project_root = Path(__file__).parent.parent
-            self.source_dir = project_root / "pipeline_generator_agent" / "output"
-            self.target_dir = project_root / "airflow" / "dags"
+    def __init__(self, source_dir=None, target_dir=None, registry_dir=None):
+        # Set paths - use provided paths or defaults relative to project root
+        project_root = Path(__file__).parent.parent
+        self.source_dir = Path(source_dir) if source_dir else project_root / "pipeline_generator_agent" / "output"
+        self.target_dir = Path(target_dir) if target_dir else project_root / "airflow" / "dags"
         
         # Ensure target directory exists
         self.target_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Versioned record of everything deployed, used for lookups and rollback (one per process)
+        self.registry = get_registry(registry_dir or Path(__file__).parent / "registry")
     
-    def deploy_file(self, filename, operation="copy"):
-        """Deploy a specific file using copy or move operation."""
+    def deploy_file(self, filename, operation="copy", metadata=None):
+        """
+        Deploy a specific file using copy or move operation.
+        
+        The deployed content is recorded as a new version in the registry, with
+        optional metadata (spec_hash, judge_score, validation). The sync manifest
+        is kept in step: a copy is recorded as synced from the source, while a
+        move takes the file out of the manifest, since sync_dags(prune=True) would
+        otherwise delete it once its source is gone.
+        """
         source_file = self.source_dir / filename
         target_file = self.target_dir / filename
         
         if not source_file.exists():
-            print(f"Source file not found: {source_file}")
+            logger.error("Source file not found", source_file=str(source_file))
             return False
         
         try:
+            source_stat = source_file.stat()
+            content = source_file.read_bytes()
+            # Write atomically so the scheduler never parses a half-written file
+            self._atomic_copy(source_file, target_file)
+            # Record what was copied; another deploy may already have replaced the target
+            self.registry.record_deploy(filename, content, **(metadata or {}))
+            with self._locked_manifest() as manifest:
+                if operation == "move":
+                    manifest.pop(filename, None)
+                else:
+                    manifest[filename] = self._manifest_entry(target_file, source_stat)
             if operation == "move":
-                shutil.move(str(source_file), str(target_file))
-                print(f"Moved: {filename}")
+                source_file.unlink()
+                logger.info("Moved DAG", filename=filename)
             else:  # default to copy
-                shutil.copy2(source_file, target_file)
-                print(f"Copied: {filename}")
+                logger.info("Copied DAG", filename=filename)
             return True
         except Exception as e:
-            print(f"Error {operation}ing {filename}: {e}")
+            logger.error("Deploy failed", filename=filename, operation=operation, error=str(e))
             return False
     
     def deploy_all_dags(self, operation="copy"):
         """Deploy all .py files from source to target directory."""
         if not self.source_dir.exists():
-            print(f"Source directory not found: {self.source_dir}")
+            logger.error("Source directory not found", source_dir=str(self.source_dir))
             return []
         
         deployed_files = []
@@ -50,12 +93,329 @@ class DeploymentAgent:
             if self.deploy_file(file_path.name, operation):
                 deployed_files.append(file_path.name)
         
-        print(f"Deployed {len(deployed_files)} DAG files using {operation}")
+        logger.info("Deployed DAG files", count=len(deployed_files), operation=operation)
         return deployed_files
     
+    def sync_dags(self, prune=False):
+        """
+        Sync .py files to the target directory, writing only files whose content changed.
+        
+        Like rsync, files whose size and mtime match the manifest are skipped without
+        hashing; otherwise the content hash decides. Writes are atomic (temp file +
+        os.replace). With prune=True, files previously synced but no longer in the
+        source directory are removed, unless their deployed content changed since or
+        they were rolled back (rollback pins them); files not written by sync are
+        never touched.
+        
+        Returns:
+            dict: written/skipped/pruned filenames plus bytes_written and bytes_skipped
+        """
+        report = {"written": [], "skipped": [], "pruned": [], "bytes_written": 0, "bytes_skipped": 0}
+        
+        if not self.source_dir.exists():
+            logger.error("Source directory not found", source_dir=str(self.source_dir))
+            return report
+        
+        with self._locked_manifest() as manifest:
+            synced = self._sync_locked(manifest, report, prune)
+            manifest.clear()
+            manifest.update(synced)
+        
+        logger.info(
+            "Synced DAGs",
+            written=len(report['written']),
+            bytes_written=report['bytes_written'],
+            skipped=len(report['skipped']),
+            bytes_skipped=report['bytes_skipped'],
+            pruned=len(report['pruned'])
+        )
+        return report
+    
+    def _sync_locked(self, manifest, report, prune):
+        """Body of sync_dags, run while holding the manifest lock; returns the new manifest."""
+        synced = {}
+        
+        for source_file in sorted(self.source_dir.glob("*.py")):
+            filename = source_file.name
+            target_file = self.target_dir / filename
+            stat = source_file.stat()
+            entry = manifest.get(filename)
+            
+            unchanged = False
+            if entry and target_file.exists() and target_file.stat().st_size == entry["size"]:
+                if entry["source_size"] == stat.st_size and entry["source_mtime_ns"] == stat.st_mtime_ns:
+                    unchanged = True
+                else:
+                    unchanged = self._file_hash(source_file) == entry["hash"]
+            
+            if unchanged:
+                entry.update({"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns})
+                synced[filename] = entry
+                report["skipped"].append(filename)
+                report["bytes_skipped"] += stat.st_size
+                continue
+            
+            try:
+                self._atomic_copy(source_file, target_file)
+            except Exception as e:
+                logger.error("Sync failed", filename=filename, error=str(e))
+                if entry:
+                    synced[filename] = entry
+                continue
+            
+            synced[filename] = self._manifest_entry(target_file, stat)
+            self.registry.record_deploy(filename, target_file.read_bytes())
+            report["written"].append(filename)
+            report["bytes_written"] += stat.st_size
+        
+        for filename, entry in manifest.items():
+            if filename in synced:
+                continue
+            if not prune or entry.get("pinned"):
+                # A rolled-back DAG stays deployed until sync writes a new version of it
+                synced[filename] = entry
+                continue
+            target_file = self.target_dir / filename
+            if target_file.exists() and self._file_hash(target_file) != entry["hash"]:
+                # Changed since sync wrote it; no longer sync's to delete
+                logger.warning("Not pruning DAG changed since last sync", filename=filename)
+                continue
+            target_file.unlink(missing_ok=True)
+            report["pruned"].append(filename)
+        
+        return synced
+    
+    def watch(self, debounce=1.0, poll_interval=1.0, validator=None, stop_event=None):
+        """
+        Run as a deploy daemon: watch the source directory and auto-deploy new or changed DAGs.
+        
+        Changes are detected with inotify when the optional `inotify_simple` package is
+        available, otherwise by polling file size/mtime every `poll_interval` seconds.
+        Bursts of writes are debounced: a batch is processed once no change has been
+        seen for `debounce` seconds. Each changed DAG is validated with DAGValidator
+        and, if valid and different from what is deployed, atomically promoted.
+        DAGs already in the source directory are handled the same way on startup.
+        
+        Args:
+            debounce (float): Quiet period in seconds before a batch is deployed
+            poll_interval (float): Polling interval in seconds for the fallback watcher
+            validator (DAGValidator): Validator to use; defaults to one reading the source directory
+            stop_event (threading.Event): Set it to stop the daemon; runs until interrupted otherwise
+        """
+        validator = validator or DAGValidator(pipeline_output_dir=str(self.source_dir))
+        stop_event = stop_event or threading.Event()
+        self.source_dir.mkdir(parents=True, exist_ok=True)
+        
+        try:
+            from inotify_simple import INotify, flags
+            inotify = INotify()
+            inotify.add_watch(str(self.source_dir), flags.CLOSE_WRITE | flags.MOVED_TO)
+            logger.info("Watching source directory", source_dir=str(self.source_dir), mode="inotify")
+        except (ImportError, OSError):
+            inotify = None
+            snapshot = self._snapshot_source()
+            logger.info("Watching source directory", source_dir=str(self.source_dir), mode="poll", poll_interval=poll_interval)
+        
+        # Files written before the watch started produce no events; deploy them now
+        existing = sorted(self._snapshot_source())
+        if existing:
+            self._deploy_batch(existing, validator)
+        
+        pending = set()
+        last_change = 0.0
+        
+        try:
+            while not stop_event.is_set():
+                if inotify:
+                    events = inotify.read(timeout=int(min(debounce, poll_interval) * 1000))
+                    changed = {event.name for event in events if event.name.endswith(".py")}
+                else:
+                    stop_event.wait(poll_interval)
+                    current = self._snapshot_source()
+                    changed = {name for name, stat in current.items() if snapshot.get(name) != stat}
+                    snapshot = current
+                
+                if changed:
+                    pending |= changed
+                    last_change = time.monotonic()
+                elif pending and time.monotonic() - last_change >= debounce:
+                    self._deploy_batch(sorted(pending), validator)
+                    pending.clear()
+        except KeyboardInterrupt:
+            logger.info("Deploy daemon stopped")
+        finally:
+            if inotify:
+                inotify.close()
+    
+    def _deploy_batch(self, filenames, validator):
+        """Validate a batch of changed DAGs and promote the valid, changed ones."""
+        deployed, rejected, unchanged = [], [], []
+        
+        for filename in filenames:
+            source_file = self.source_dir / filename
+            target_file = self.target_dir / filename
+            if not source_file.exists():
+                continue
+            
+            if target_file.exists() and self._file_hash(source_file) == self._file_hash(target_file):
+                unchanged.append(filename)
+                continue
+            
+            validation_result = validator.validate_dag(filename)
+            if not validation_result["success"]:
+                logger.warning("Rejected DAG", filename=filename, errors=validation_result['errors'])
+                rejected.append(filename)
+                continue
+            
+            metadata = {"validation": {"success": True, "warnings": validation_result.get("warnings", [])}}
+            if self.deploy_file(filename, "copy", metadata=metadata):
+                deployed.append(filename)
+        
+        logger.info("Deploy batch", deployed=len(deployed), rejected=len(rejected), unchanged=len(unchanged))
+        return {"deployed": deployed, "rejected": rejected, "unchanged": unchanged}
+    
+    def _snapshot_source(self):
+        """Map each source .py file to its (size, mtime_ns) for change polling."""
+        snapshot = {}
+        for file_path in self.source_dir.glob("*.py"):
+            try:
+                stat = file_path.stat()
+            except FileNotFoundError:
+                continue
+            snapshot[file_path.name] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+    
+    def _atomic_copy(self, source_file, target_file):
+        """Copy a file to a temp file in the target directory, then os.replace it into place."""
+        # Temp names don't end in .py, so Airflow never picks them up
+        fd, temp_path = tempfile.mkstemp(dir=target_file.parent, prefix=f".{target_file.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as temp_file, open(source_file, "rb") as f:
+                shutil.copyfileobj(f, temp_file)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            shutil.copystat(source_file, temp_path)
+            os.replace(temp_path, target_file)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+    
+    def _atomic_write(self, target_file, content):
+        """Write bytes to a temp file in the target directory, then os.replace it into place."""
+        fd, temp_path = tempfile.mkstemp(dir=target_file.parent, prefix=f".{target_file.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, target_file)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+    
+    def _file_hash(self, path):
+        """SHA-256 of a file's content."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _manifest_entry(self, target_file, source_stat):
+        """Manifest record of a deployed file and the source stat it was copied from."""
+        return {
+            "hash": self._file_hash(target_file),
+            "size": target_file.stat().st_size,
+            "source_size": source_stat.st_size,
+            "source_mtime_ns": source_stat.st_mtime_ns,
+        }
+    
+    @contextmanager
+    def _locked_manifest(self):
+        """Load the manifest under a thread and file lock, and save it when the block exits cleanly."""
+        with _manifest_lock, file_lock(self.target_dir / f"{MANIFEST_FILENAME}.lock"):
+            manifest = self._load_manifest()
+            yield manifest
+            self._save_manifest(manifest)
+    
+    def _load_manifest(self):
+        """Load the sync manifest, or an empty one if it is missing or unreadable."""
+        manifest_path = self.target_dir / MANIFEST_FILENAME
+        try:
+            with open(manifest_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+    
+    def _save_manifest(self, manifest):
+        """Write the sync manifest atomically."""
+        manifest_path = self.target_dir / MANIFEST_FILENAME
+        fd, temp_path = tempfile.mkstemp(dir=self.target_dir, prefix=f"{MANIFEST_FILENAME}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+            os.replace(temp_path, manifest_path)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+    
     def get_deployed_path(self, filename):
         """Get the full path where a file would be deployed."""
         return str(self.target_dir / filename)
+    
+    def get_live_version(self, dag_id):
+        """Get the live version record (hashes, judge score, validation, timestamp) of a DAG."""
+        return self.registry.get_live(dag_id)
+    
+    def list_versions(self, dag_id):
+        """List every deployed version of a DAG, oldest first."""
+        return self.registry.list_versions(dag_id)
+    
+    def rollback(self, dag_id, version=None):
+        """
+        Redeploy a previous version of a DAG from the versions store.
+        
+        The sync manifest is updated to the restored content and pinned, so
+        sync_dags keeps the rollback until the source file changes and never
+        prunes it.
+        
+        Args:
+            dag_id (str): DAG to roll back
+            version (int): Version to restore; defaults to the one before the live version
+            
+        Returns:
+            dict: The restored version record, or None if there is nothing to roll back to
+        """
+        live = self.registry.get_live(dag_id)
+        if not live:
+            logger.warning("No deployed versions for DAG", dag_id=dag_id)
+            return None
+        
+        if version is None:
+            version = live["version"] - 1
+        record = self.registry.get_version(dag_id, version)
+        if not record:
+            logger.warning("Version not found for DAG", dag_id=dag_id, version=version)
+            return None
+        
+        content = self.registry.read_content(record)
+        self._atomic_write(self.target_dir / record["filename"], content)
+        
+        # A renamed DAG file from the newer version would otherwise stay live
+        if live["filename"] != record["filename"]:
+            (self.target_dir / live["filename"]).unlink(missing_ok=True)
+        
+        with self._locked_manifest() as manifest:
+            if record["filename"] in manifest:
+                manifest[record["filename"]].update(
+                    hash=hashlib.sha256(content).hexdigest(), size=len(content), pinned=True
+                )
+            if live["filename"] != record["filename"]:
+                manifest.pop(live["filename"], None)
+        
+        self.registry.record_rollback(dag_id, version)
+        logger.info("Rolled back DAG", dag_id=dag_id, version=version)
+        return record
 
 
 if __name__ == "__main__":
@@ -78,3 +438,8 @@ if __name__ == "__main__":
     print("\n=== Example 3: Move operation ===")
     agent3 = DeploymentAgent()
     agent3.deploy_file("file_to_file_etl_pipeline_final.py", "move")
+    
+    # Example 4: Incremental sync, removing DAGs that left the output directory
+    print("\n=== Example 4: Incremental sync ===")
+    agent4 = DeploymentAgent()
+    agent4.sync_dags(prune=True)
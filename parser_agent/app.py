@@ -1,7 +1,27 @@
+import os
+import sys
 from flask import Flask, request, jsonify
 from parser_agent import parse_request
 
+# Add parent directory to path for shared modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.single_flight import SingleFlight
+from common.llm_scheduler import get_scheduler
+from common.resilience import resilience_metrics
+from common.http_compression import enable_gzip
+from common.tracing import continue_trace
+from common.assets import asset_metrics
+from common.prefork import serve
+
 app = Flask(__name__)
+enable_gzip(app)
+
+# Identical concurrent /parse requests share one LLM call; successful parses are reused briefly
+parse_flight = SingleFlight(
+    ttl=float(os.getenv("PARSE_MEMO_TTL", "30")),
+    cache_if=lambda result: "error" not in result
+)
 
 @app.route('/parse', methods=['POST'])
 def parse_endpoint():
@@ -22,8 +42,9 @@ def parse_endpoint():
         # Extract the 'req' value
         req_value = data['req']
         
-        # Process the request using the parser agent
-        parsed_result = parse_request(req_value)
+        # Process the request using the parser agent, as part of the caller's trace
+        with continue_trace("parser.request", request.headers.get('X-Trace-Id'), request.headers.get('X-Parent-Span-Id')):
+            parsed_result = parse_flight.do(SingleFlight.normalize_key(req_value), lambda: parse_request(req_value))
         
         # Return the parsed result from the parser agent
         response_data = {
@@ -40,6 +61,18 @@ def parse_endpoint():
             'status': 'error'
         }), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Request coalescing metrics
+    """
+    return jsonify({
+        'parse_coalescing': parse_flight.metrics(),
+        'llm_scheduler': get_scheduler().metrics(),
+        'llm_resilience': resilience_metrics(),
+        'assets': asset_metrics()
+    }), 200
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """
@@ -51,4 +84,4 @@ def health_check():
     }), 200
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=8001)
+    serve(app, host='0.0.0.0', port=8001, debug=True)
@@ -1,25 +1,95 @@
 from datetime import datetime
 import json
 import os
+import sys
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.output_parsers import StructuredOutputParser, ResponseSchema
+
+# Add parent directory to path for shared modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.llm_scheduler import RateLimitError
+from common.resilience import invoke_llm, CircuitOpenError
+from common.model_router import get_router, RoutedCall
+from common.structured_logging import get_logger
+from common import assets
+try:
+    from parser_agent.spec_validator import validate_spec
+except ImportError:
+    # Run as the parser service from this directory, where "parser_agent" is this module
+    from spec_validator import validate_spec
+
+logger = get_logger("parser")
 
 # Load environment variables from config.env file
 load_dotenv(os.path.join(os.path.dirname(__file__), 'config.env'))
 
-# Define response schemas for structured output matching the system prompt
-response_schemas = [
-    ResponseSchema(name="user_request", description="The original user request"),
-    ResponseSchema(name="source", description="Source configuration with type, endpoint_or_table, and query_or_filter"),
-    ResponseSchema(name="destination", description="Destination configuration with type and path"),
-    ResponseSchema(name="transformations", description="List of transformation steps with step_number, language, operation, and target"),
-    ResponseSchema(name="confidence", description="Overall parse confidence score from 0-1")
-]
+SYSTEM_PROMPT_PATH = os.path.join(os.path.dirname(__file__), 'system_prompt.txt')
+
+# Response schemas (name, description) for structured output matching the system prompt
+RESPONSE_SCHEMAS = (
+    ("user_request", "The original user request"),
+    ("source", "Source configuration with type, endpoint_or_table, query_or_filter, and optional incremental (mode and column)"),
+    ("destination", "Destination configuration with type and path"),
+    ("transformations", "List of transformation steps with step_number, language, operation, and target"),
+    ("confidence", "Overall parse confidence score from 0-1")
+)
+
+PARSE_MESSAGE = "Parse this request into detailed requirements: {request}"
+
+def _error_type(error: Exception) -> str:
+    """Classify a parse failure so callers can tell upstream trouble from bad input."""
+    if isinstance(error, RateLimitError):
+        return "rate_limited"
+    if isinstance(error, CircuitOpenError):
+        return "upstream_unavailable"
+    if isinstance(error, TimeoutError):
+        return "timeout"
+    return "parse_error"
+
+# Follow-up message asking the model to fix only the fields the validator rejected
+REPARSE_MESSAGE = (
+    "Your previous parse of this request had problems in these fields: {fields}.\n"
+    "Problems:\n{errors}\n\n"
+    "Previous parse:\n{spec}\n\n"
+    "Original request: {request}\n\n"
+    "Return the full JSON object again with only those fields corrected."
+)
+
+def _output_parser():
+    """Structured output parser for the spec fields (built once, on first use)."""
+    return assets.structured_output_parser(RESPONSE_SCHEMAS)
+
+def _prompt(human_message: str):
+    """Parser prompt template with the system prompt file and a human message (built once per message)."""
+    return assets.prompt_template(("system", assets.prompt_text(SYSTEM_PROMPT_PATH)), ("human", human_message))
 
-# Create the output parser
-output_parser = StructuredOutputParser.from_response_schemas(response_schemas)
+@assets.register_preload
+def _preload_assets():
+    _output_parser()
+    _prompt(PARSE_MESSAGE)
+    _prompt(REPARSE_MESSAGE)
+
+def _reparse_fields(model, request: str, validation: dict) -> dict:
+    """
+    Re-ask the model for just the fields the validator rejected.
+    
+    Returns:
+        dict: Validation result for the previous spec with the corrected fields merged in
+    """
+    chain = _prompt(REPARSE_MESSAGE) | model | _output_parser()
+    corrected = invoke_llm(chain, {
+        "fields": ", ".join(validation["fields"]),
+        "errors": "\n".join(f"- {error}" for error in validation["errors"]),
+        "spec": json.dumps(validation["spec"], indent=2, default=str),
+        "request": request
+    }, agent="parser")
+    
+    merged = dict(validation["spec"]) if isinstance(validation["spec"], dict) else {}
+    if isinstance(corrected, dict):
+        for field in validation["fields"]:
+            if field in corrected:
+                merged[field] = corrected[field]
+    return validate_spec(merged, request)
 
 def parse_request(request: str) -> dict:
     """
@@ -32,43 +102,50 @@ def parse_request(request: str) -> dict:
         dict: Structured output with parsed requirements
     """
     try:
-        # Initialize Google Gemini model
-        model = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            temperature=0.1,
-            convert_system_message_to_human=True,
-            google_api_key=os.getenv("GOOGLE_API_KEY")
-        )
-
-        # Read system prompt from file
-        system_prompt_path = os.path.join(os.path.dirname(__file__), 'system_prompt.txt')
-        with open(system_prompt_path, 'r') as f:
-            system_prompt = f.read()
-
-        # Create a simple prompt using the system prompt from file
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("human", "Parse this request into detailed requirements: {request}")
-        ])
+        # Pick the model tier for this request
+        router = get_router()
+        decision = router.route("parser", request=request)
+        
+        # Google Gemini model for the routed tier (created once per model)
+        model = assets.chat_model(decision["model"], decision["temperature"])
+
+        # Create the chain: prompt (system prompt from file) | model | parser
+        chain = _prompt(PARSE_MESSAGE) | model | _output_parser()
+        
+        # Execute the parsing through the shared LLM scheduler and stage guard
+        with RoutedCall(router, decision) as routed_call:
+            result = invoke_llm(chain, {"request": request}, agent="parser")
+            validation = validate_spec(result, request)
+            routed_call.success = validation["valid"]
         
-        # Create the chain: prompt | model | parser
-        chain = prompt | model | output_parser
+        # Malformed specs get one targeted re-parse instead of failing in the generator
+        if not validation["valid"]:
+            logger.warning("Parsed spec invalid, re-parsing fields", errors=validation["errors"])
+            validation = _reparse_fields(model, request, validation)
         
-        # Execute the parsing
-        result = chain.invoke({"request": request})
+        if not validation["valid"]:
+            logger.error("Parsed spec still invalid after re-parse", errors=validation["errors"])
+            return {
+                "status": "error",
+                "original_request": request,
+                "error": f"Parsed specification is invalid: {'; '.join(validation['errors'])}",
+                "error_type": "invalid_spec",
+                "validation_errors": validation["errors"],
+                "timestamp": datetime.now().isoformat()
+            }
         
-        print("--------------------------------")
-        print("Parsed Requirements:")
-        print(json.dumps(result, indent=2))
-        print("--------------------------------")
+        result = validation["spec"]
+        logger.info("Parsed requirements", spec=result, repairs=validation["repairs"])
         
         return result
         
     except Exception as e:
+        logger.error("Parsing failed", error=str(e), error_type=_error_type(e))
         return {
             "status": "error",
             "original_request": request,
             "error": str(e),
+            "error_type": _error_type(e),
             "timestamp": datetime.now().isoformat()
         }
 
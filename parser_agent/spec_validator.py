@@ -0,0 +1,231 @@
+"""
+Validation and normalization of parser output before it reaches the generator.
+
+A malformed spec (no destination path, transformations that are not a list,
+"null" strings instead of nulls) otherwise costs several generator and judge
+LLM calls before it fails. `validate_spec` repairs the quirks it knows in
+place of a new LLM call and reports the rest as errors naming the broken
+fields, so the parser can re-ask for just those.
+
+Only the standard library is used; checks are plain dict/str operations and
+run in microseconds.
+"""
+
+import json
+import re
+
+SPEC_FIELDS = ("user_request", "source", "destination", "transformations", "confidence")
+
+# Strings the LLM uses where it means "no value"
+NULL_STRINGS = frozenset({"", "null", "none", "n/a", "na", "nil", "undefined"})
+
+INCREMENTAL_MODES = frozenset({"watermark", "file_mtime"})
+
+_PERCENT = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*%\s*$")
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+_FIELD_NAME = re.compile(r"^[a-z_]+")
+
+
+def _is_null(value) -> bool:
+    return value is None or (isinstance(value, str) and value.strip().lower() in NULL_STRINGS)
+
+
+def _maybe_json(value):
+    """Decode a JSON object/array the LLM returned as a string; anything else is returned unchanged."""
+    if isinstance(value, str):
+        text = _CODE_FENCE.sub("", value.strip())
+        if text[:1] in ("{", "["):
+            try:
+                return json.loads(text)
+            except json.JSONDecodeError:
+                pass
+    return value
+
+
+def _clean_scalar(value):
+    """Null-like strings become None; other strings are stripped."""
+    if _is_null(value):
+        return None
+    return value.strip() if isinstance(value, str) else value
+
+
+def validate_spec(spec, request: str = None) -> dict:
+    """
+    Validate and normalize a parsed pipeline specification.
+
+    Args:
+        spec: Parser output (a dict, or a JSON string of one)
+        request (str): The original request, used to fill a missing user_request
+
+    Returns:
+        dict: {
+            "valid": bool,
+            "spec": normalized spec (a new dict; the input is not modified),
+            "errors": ["<field>: <problem>", ...] for problems that need a re-parse,
+            "fields": top-level fields with errors,
+            "repairs": ["<field>: <what was coerced>", ...]
+        }
+    """
+    errors, repairs = [], []
+    spec = _maybe_json(spec)
+    if not isinstance(spec, dict):
+        return {
+            "valid": False,
+            "spec": spec,
+            "errors": [f"spec: expected a JSON object, got {type(spec).__name__}"],
+            "fields": list(SPEC_FIELDS),
+            "repairs": repairs,
+        }
+
+    normalized = dict(spec)
+
+    # user_request
+    if _is_null(normalized.get("user_request")):
+        if request:
+            normalized["user_request"] = request.strip()
+            repairs.append("user_request: filled from the original request")
+        else:
+            errors.append("user_request: missing")
+
+    normalized["source"] = _normalize_source(normalized.get("source"), errors, repairs)
+    normalized["destination"] = _normalize_destination(normalized.get("destination"), errors, repairs)
+    normalized["transformations"] = _normalize_transformations(normalized.get("transformations"), errors, repairs)
+    normalized["confidence"] = _normalize_confidence(normalized.get("confidence"), repairs)
+
+    fields = sorted({_FIELD_NAME.match(error).group(0) for error in errors})
+    return {"valid": not errors, "spec": normalized, "errors": errors, "fields": fields, "repairs": repairs}
+
+
+def _normalize_source(source, errors: list, repairs: list):
+    source = _maybe_json(source)
+    if not isinstance(source, dict):
+        errors.append("source: expected an object with type, endpoint_or_table and query_or_filter")
+        return source
+
+    source = dict(source)
+    source_type = _clean_scalar(source.get("type"))
+    if source_type is None:
+        errors.append("source.type: missing")
+    source["type"] = source_type
+
+    endpoint = _clean_scalar(source.get("endpoint_or_table"))
+    if endpoint is None:
+        errors.append("source.endpoint_or_table: missing")
+    source["endpoint_or_table"] = endpoint
+
+    query = source.get("query_or_filter")
+    if isinstance(query, str) and _is_null(query):
+        repairs.append(f"source.query_or_filter: {query!r} -> null")
+    source["query_or_filter"] = _clean_scalar(query)
+
+    if "incremental" in source:
+        source["incremental"] = _normalize_incremental(source["incremental"], repairs)
+    return source
+
+
+def _normalize_incremental(incremental, repairs: list):
+    incremental = _maybe_json(incremental)
+    if _is_null(incremental):
+        return None
+    if isinstance(incremental, str):
+        # A bare mode name, e.g. "file_mtime"
+        incremental = {"mode": incremental}
+        repairs.append("source.incremental: mode string -> object")
+    if not isinstance(incremental, dict):
+        repairs.append("source.incremental: unrecognized value dropped")
+        return None
+
+    mode = str(incremental.get("mode") or "").strip().lower()
+    if mode not in INCREMENTAL_MODES:
+        repairs.append(f"source.incremental: unknown mode {incremental.get('mode')!r} dropped")
+        return None
+    normalized = dict(incremental, mode=mode)
+    if mode == "watermark":
+        column = _clean_scalar(incremental.get("column"))
+        if column is None:
+            # A watermark without a column cannot be generated; fall back to a full load
+            repairs.append("source.incremental: watermark without column dropped")
+            return None
+        normalized["column"] = column
+    return normalized
+
+
+def _normalize_destination(destination, errors: list, repairs: list):
+    destination = _maybe_json(destination)
+    if not isinstance(destination, dict):
+        errors.append("destination: expected an object with type and path")
+        return destination
+
+    destination = dict(destination)
+    destination_type = _clean_scalar(destination.get("type"))
+    if destination_type is None:
+        errors.append("destination.type: missing")
+    destination["type"] = destination_type
+
+    path = _clean_scalar(destination.get("path"))
+    if path is None:
+        # Some parses put the table name under "table" instead of "path"
+        for alias in ("table", "endpoint_or_table", "target"):
+            path = _clean_scalar(destination.get(alias))
+            if path is not None:
+                repairs.append(f"destination.path: taken from destination.{alias}")
+                break
+    if path is None:
+        errors.append("destination.path: missing")
+    destination["path"] = path
+    return destination
+
+
+def _normalize_transformations(transformations, errors: list, repairs: list) -> list:
+    transformations = _maybe_json(transformations)
+    if _is_null(transformations):
+        if transformations is not None:
+            repairs.append(f"transformations: {transformations!r} -> []")
+        return []
+    if isinstance(transformations, dict):
+        transformations = [transformations]
+        repairs.append("transformations: single step wrapped in a list")
+    elif isinstance(transformations, str):
+        transformations = [transformations]
+        repairs.append("transformations: description string wrapped in a list")
+    elif not isinstance(transformations, list):
+        errors.append(f"transformations: expected a list, got {type(transformations).__name__}")
+        return []
+
+    steps = []
+    for index, step in enumerate(transformations, start=1):
+        step = _maybe_json(step)
+        if isinstance(step, str):
+            if _is_null(step):
+                continue
+            step = {"operation": step.strip()}
+            repairs.append(f"transformations[{index}]: description string -> step object")
+        if not isinstance(step, dict):
+            errors.append(f"transformations[{index}]: expected an object, got {type(step).__name__}")
+            continue
+
+        step = dict(step)
+        if _is_null(step.get("operation")):
+            errors.append(f"transformations[{index}].operation: missing")
+        if step.get("step_number") != len(steps) + 1:
+            step["step_number"] = len(steps) + 1
+        step.setdefault("language", "python")
+        step["target"] = _clean_scalar(step.get("target"))
+        steps.append(step)
+    return steps
+
+
+def _normalize_confidence(confidence, repairs: list) -> float:
+    if isinstance(confidence, str):
+        percent = _PERCENT.match(confidence)
+        try:
+            confidence = float(percent.group(1)) / 100 if percent else float(confidence)
+        except ValueError:
+            confidence = None
+    if isinstance(confidence, bool) or not isinstance(confidence, (int, float)):
+        repairs.append("confidence: missing or not a number -> 0.5")
+        return 0.5
+    if 1 < confidence <= 100:
+        repairs.append("confidence: percentage scaled to 0-1")
+        confidence = confidence / 100
+    return max(0.0, min(1.0, float(confidence)))
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark for the paginated API extract pattern.
+
+Starts a local stand-in HTTP server that serves paginated JSON (with simulated
+latency and occasional 429 responses), then runs the example extract callable
+from api_extract_prompt.txt against it and compares page throughput with a
+plain sequential requests.get loop.
+
+** This file is for testing only **
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_handler(total_pages: int, latency: float, throttle_rate: float):
+    """Build a request handler serving `total_pages` pages of fake sales rows."""
+    throttled = set()
+    lock = threading.Lock()
+
+    class PaginatedHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            page = int(query.get("page", ["1"])[0])
+            per_page = int(query.get("per_page", ["100"])[0])
+
+            # Throttle each page at most once so the client's backoff is exercised
+            with lock:
+                throttle = page not in throttled and random.random() < throttle_rate
+                if throttle:
+                    throttled.add(page)
+            if throttle:
+                self._send(429, {"error": "rate limited"}, {"Retry-After": "0"})
+                return
+
+            time.sleep(latency)
+            rows = [{"id": (page - 1) * per_page + i, "customer_id": i} for i in range(per_page)]
+            self._send(200, {"page": page, "total_pages": total_pages, "data": rows})
+
+        def _send(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return PaginatedHandler
+
+
+def load_example_extract():
+    """Load `_extract_api_pages` from the example code block in the prompt file."""
+    prompt_path = os.path.join(os.path.dirname(__file__), "api_extract_prompt.txt")
+    with open(prompt_path, "r") as f:
+        prompt = f.read()
+
+    code = re.search(r"```python\n(.*?)```", prompt, re.DOTALL).group(1)
+    # The prompt is a template, so literal braces are doubled
+    code = code.replace("{{", "{").replace("}}", "}")
+
+    namespace = {}
+    exec(code, namespace)
+    return namespace["_extract_api_pages"]
+
+
+def sequential_baseline(endpoint: str, staging_dir: str, page_size: int) -> int:
+    """One blocking requests.get per page with no session reuse (the old pattern)."""
+    import requests
+
+    page, total_pages = 1, 1
+    while page <= total_pages:
+        response = requests.get(endpoint, params={"page": page, "per_page": page_size}, timeout=30)
+        if response.status_code == 429:
+            continue
+        response.raise_for_status()
+        body = response.json()
+        total_pages = body["total_pages"]
+        with open(os.path.join(staging_dir, "page_%05d.json" % page), "w") as f:
+            json.dump(body, f)
+        page += 1
+    return total_pages
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--pages", type=int, default=100)
+    arg_parser.add_argument("--page-size", type=int, default=200)
+    arg_parser.add_argument("--latency", type=float, default=0.02, help="Server latency per page (seconds)")
+    arg_parser.add_argument("--throttle-rate", type=float, default=0.05, help="Fraction of pages answered with 429 once")
+    arg_parser.add_argument("--workers", type=int, default=8)
+    args = arg_parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.pages, args.latency, args.throttle_rate))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}/v1/sales"
+
+    extract = load_example_extract()
+
+    try:
+        with tempfile.TemporaryDirectory() as staging_dir:
+            start = time.perf_counter()
+            sequential_baseline(endpoint, staging_dir, args.page_size)
+            baseline_seconds = time.perf_counter() - start
+
+        with tempfile.TemporaryDirectory() as staging_dir:
+            start = time.perf_counter()
+            extract(endpoint, staging_dir, args.workers, args.page_size)
+            concurrent_seconds = time.perf_counter() - start
+            written = len(os.listdir(staging_dir))
+    finally:
+        server.shutdown()
+
+    print(f"Pages: {args.pages} (written by concurrent extract: {written})")
+    print(f"Sequential: {baseline_seconds:.2f}s ({args.pages / baseline_seconds:.1f} pages/s)")
+    print(f"Concurrent: {concurrent_seconds:.2f}s ({args.pages / concurrent_seconds:.1f} pages/s)")
+    print(f"Speedup: {baseline_seconds / concurrent_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
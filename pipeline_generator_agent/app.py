@@ -1,8 +1,16 @@
 from flask import Flask, request, jsonify
 from pipeline_generator_agent import generate_pipeline
+from common.llm_scheduler import get_scheduler, RateLimitError
+from common.resilience import resilience_metrics, CircuitOpenError, DeadlineExceededError
+from common.http_compression import enable_gzip
+from common.tracing import continue_trace
+from common.dag_library import get_library
+from common.assets import asset_metrics
+from common.prefork import serve
 import json
 
 app = Flask(__name__)
+enable_gzip(app)
 
 @app.route('/generate', methods=['POST'])
 def generate_pipeline_endpoint():
@@ -17,7 +25,8 @@ def generate_pipeline_endpoint():
             "destination": {...},
             "transformations": [...],
             "confidence": 0.8
-        }
+        },
+        "save_to_file": true    (optional, also write the DAG to output/)
     }
     
     Returns:
@@ -37,18 +46,48 @@ def generate_pipeline_endpoint():
         
         pipeline_spec = data['pipeline_spec']
         
-        # Generate the pipeline
-        dag_code = generate_pipeline(pipeline_spec)
+        # Generate the pipeline, as part of the caller's trace
+        with continue_trace("generator.request", request.headers.get('X-Trace-Id'), request.headers.get('X-Parent-Span-Id')):
+            dag_code = generate_pipeline(pipeline_spec, save_to_file=data.get('save_to_file', True))
         
-        # Return the Python code as plain text
-        return dag_code, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+        # Return the Python code as plain text; a DAG reused from this service's library says so,
+        # since the caller judges it and must not let a degraded fallback pass
+        headers = {'Content-Type': 'text/plain; charset=utf-8'}
+        reuse = get_library().reuse_info(dag_code)
+        if reuse:
+            headers['X-DAG-Reuse'] = json.dumps(reuse)
+        return dag_code, 200, headers
         
+    except RateLimitError as e:
+        return jsonify({
+            "error": str(e),
+            "status": "rate_limited"
+        }), 429
+    except CircuitOpenError as e:
+        return jsonify({
+            "error": str(e),
+            "status": "unavailable"
+        }), 503
+    except DeadlineExceededError as e:
+        return jsonify({
+            "error": str(e),
+            "status": "timeout"
+        }), 504
     except Exception as e:
         return jsonify({
             "error": str(e),
             "status": "error"
         }), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """LLM scheduler and resilience (hedging, circuit breaker) metrics."""
+    return jsonify({
+        "llm_scheduler": get_scheduler().metrics(),
+        "llm_resilience": resilience_metrics(),
+        "assets": asset_metrics()
+    })
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
@@ -58,4 +97,4 @@ def health_check():
     })
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    serve(app, host='0.0.0.0', port=5001, debug=True)
@@ -1,11 +1,30 @@
 import os
+import re
+from contextlib import nullcontext
 from pipeline_generator_agent.pipeline_generator_agent import generate_pipeline
 from pipeline_generator_agent.judge_agent import JudgeAgent
+from common.dag_library import get_library
+from common.llm_scheduler import llm_priority, RateLimitError, RETRY
+from common.resilience import CircuitOpenError, DeadlineExceededError
+from common.model_router import get_router, spec_hash
+from common.tracing import span, current_trace_id
+from common.history_store import get_history_store
+from common.service_client import ServiceError
+from common.structured_logging import get_logger
+
+logger = get_logger("integration")
 
 class IntegrationAgent:
-    def __init__(self):
-        """Initialize the integration agent with generator and judge."""
-        self.generator = None  # Will use the generate_pipeline function directly
+    def __init__(self, generator=None):
+        """
+        Initialize the integration agent with generator and judge.
+        
+        Args:
+            generator (callable): Maps a pipeline spec to DAG code; defaults to
+                the in-process generate_pipeline (the controller passes a remote
+                generator service client in remote mode)
+        """
+        self.generator = generator or (lambda pipeline_spec: generate_pipeline(pipeline_spec, save_to_file=False))
         self.judge = JudgeAgent()
         self.max_retries = 3
 
@@ -19,28 +38,61 @@ class IntegrationAgent:
         Returns:
             dict: Result with success status, DAG code, and evaluation
         """
-        print(f"Starting pipeline generation with max {self.max_retries} retries...")
+        logger.info("Starting pipeline generation", max_retries=self.max_retries)
         
         for attempt in range(1, self.max_retries + 1):
-            print(f"\n--- Attempt {attempt}/{self.max_retries} ---")
+            logger.debug("Attempt started", attempt=attempt, max_retries=self.max_retries)
             
             try:
-                # Generate the pipeline
-                print("Generating pipeline...")
-                dag_code = generate_pipeline(pipeline_spec, save_to_file=False)
-                
-                # Judge the generated pipeline
-                print("Evaluating pipeline quality...")
-                evaluation = self.judge.evaluate_dag(dag_code)
+                # Retries queue behind first attempts in the LLM scheduler
+                with span("attempt", attempt=attempt) as attempt_span, \
+                        (llm_priority(RETRY) if attempt > 1 else nullcontext()):
+                    # Generate the pipeline
+                    dag_code = self.generator(pipeline_spec)
+                    
+                    # Judge the generated pipeline (reused approved DAGs are judged against this spec too)
+                    evaluation = self.judge.evaluate_dag(dag_code, pipeline_spec)
+                    reuse = get_library().reuse_info(dag_code)
+                    if reuse:
+                        evaluation['reused'] = True
+                        if reuse['fallback']:
+                            # Closest-match DAG served while the generator was unavailable: a draft, never a pass
+                            evaluation['passed'] = False
+                            evaluation['issues'] = list(evaluation.get('issues', [])) + [
+                                f"Fallback DAG from a similar approved spec (similarity {reuse['similarity']}) "
+                                "while the generator LLM was unavailable; it may not implement this spec"
+                            ]
+                    
+                    attempt_span.attributes.update({
+                        "judge_score": evaluation.get('score'),
+                        "passed": evaluation.get('passed', False),
+                        "issues": len(evaluation.get('issues', [])),
+                        "reused": evaluation.get('reused', False)
+                    })
                 
-                print(f"Judge Score: {evaluation['score']}/100")
-                print(f"Passed: {evaluation['passed']}")
+                # Judge verdicts on LLM output feed back into model routing
+                if not reuse:
+                    get_router().record_judgement(pipeline_spec, evaluation.get('score', 0), evaluation.get('passed', False))
+                self._record_attempt(attempt, pipeline_spec, dag_code=dag_code, evaluation=evaluation)
                 
-                if evaluation['issues']:
-                    print(f"Issues found: {evaluation['issues']}")
+                logger.info(
+                    "Attempt judged",
+                    attempt=attempt,
+                    score=evaluation['score'],
+                    passed=evaluation['passed'],
+                    issues=evaluation['issues']
+                )
                 
+                if reuse and reuse['fallback']:
+                    # Retrying would only serve the same fallback while the generator is down
+                    return {
+                        "success": False,
+                        "attempt": attempt,
+                        "dag_code": dag_code,
+                        "evaluation": evaluation,
+                        "message": "Generator LLM unavailable; returning the closest approved DAG as an unapproved draft"
+                    }
                 if evaluation['passed']:
-                    print("✅ Pipeline generation successful!")
                     return {
                         "success": True,
                         "attempt": attempt,
@@ -49,13 +101,12 @@ class IntegrationAgent:
                         "message": "Pipeline generated and validated successfully"
                     }
                 else:
-                    print(f"❌ Pipeline failed validation (Score: {evaluation['score']})")
                     if attempt < self.max_retries:
-                        print("Retrying with feedback...")
+                        logger.info("Retrying with judge feedback", attempt=attempt, score=evaluation['score'])
                         # Add feedback to pipeline spec for next attempt
                         pipeline_spec = self._add_feedback_to_spec(pipeline_spec, evaluation)
                     else:
-                        print("Max retries reached. Returning best attempt.")
+                        logger.warning("Max retries reached, returning best attempt", score=evaluation['score'])
                         return {
                             "success": False,
                             "attempt": attempt,
@@ -64,8 +115,19 @@ class IntegrationAgent:
                             "message": f"Pipeline failed validation after {self.max_retries} attempts"
                         }
                         
+            except (RateLimitError, CircuitOpenError, DeadlineExceededError, ServiceError) as e:
+                # The scheduler already backed off / the upstream is degraded; more attempts would only add load
+                logger.error("LLM unavailable", attempt=attempt, error=str(e))
+                self._record_attempt(attempt, pipeline_spec, error=str(e))
+                return {
+                    "success": False,
+                    "attempt": attempt,
+                    "error": str(e),
+                    "message": f"Pipeline generation stopped, LLM unavailable: {str(e)}"
+                }
             except Exception as e:
-                print(f"❌ Error in attempt {attempt}: {str(e)}")
+                logger.error("Attempt failed", attempt=attempt, error=str(e))
+                self._record_attempt(attempt, pipeline_spec, error=str(e))
                 if attempt == self.max_retries:
                     return {
                         "success": False,
@@ -73,7 +135,7 @@ class IntegrationAgent:
                         "error": str(e),
                         "message": f"Pipeline generation failed after {self.max_retries} attempts"
                     }
-                print("Retrying...")
+                logger.info("Retrying", attempt=attempt)
         
         # This should never be reached, but just in case
         return {
@@ -82,6 +144,23 @@ class IntegrationAgent:
             "message": "Unexpected error in pipeline generation"
         }
 
+    def _record_attempt(self, attempt: int, pipeline_spec: dict, dag_code: str = None,
+                        evaluation: dict = None, error: str = None):
+        """Queue an attempt for the flow history store (keyed by the current trace id)."""
+        evaluation = evaluation or {}
+        dag_id_match = re.search(r"dag_id\s*=\s*['\"]([^'\"]+)['\"]", dag_code or "")
+        get_history_store().record_attempt(
+            flow_id=current_trace_id(),
+            attempt=attempt,
+            dag_id=dag_id_match.group(1) if dag_id_match else None,
+            spec_hash=spec_hash(pipeline_spec),
+            judge_score=evaluation.get('score'),
+            passed=evaluation.get('passed') if evaluation else None,
+            reused=evaluation.get('reused', False) if evaluation else None,
+            issues=evaluation.get('issues'),
+            error=error
+        )
+
     def _add_feedback_to_spec(self, pipeline_spec: dict, evaluation: dict) -> dict:
         """
         Add judge feedback to the pipeline specification for retry.
@@ -144,7 +223,7 @@ class IntegrationAgent:
         with open(file_path, 'w') as f:
             f.write(dag_code)
         
-        print(f"Final DAG saved to: {file_path}")
+        logger.info("Final DAG saved", file_path=file_path)
         return file_path
 
 
@@ -1,25 +1,25 @@
 import os
 import ast
 import json
+import sys
+from contextlib import nullcontext
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import ChatPromptTemplate
+
+# Add parent directory to path for shared modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.llm_scheduler import RateLimitError
+from common.resilience import invoke_llm, CircuitOpenError, DeadlineExceededError
+from common.model_router import get_router, RoutedCall, TIER_MODELS, TIER_TEMPERATURE
+from common.structured_logging import get_logger
+from common import assets
+
+logger = get_logger("judge")
 
 # Load environment variables
 load_dotenv(os.path.join(os.path.dirname(__file__), 'config.env'))
 
-class JudgeAgent:
-    def __init__(self):
-        """Initialize the judge agent with Google Gemini model."""
-        self.model = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            temperature=0.1,
-            convert_system_message_to_human=True,
-            google_api_key=os.getenv("GOOGLE_API_KEY")
-        )
-        
-        self.judge_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a code quality judge for Airflow DAGs. Evaluate the generated DAG code and provide a score from 0-100.
+JUDGE_SYSTEM_PROMPT = """You are a code quality judge for Airflow DAGs. Evaluate the generated DAG code and provide a score from 0-100.
 
 Evaluation Criteria:
 1. **Syntax & Structure (25 points)**: Valid Python syntax, proper Airflow DAG structure
@@ -35,16 +35,25 @@ Return ONLY a JSON response with this exact format:
     "suggestions": ["list of improvement suggestions"]
 }}
 
-A score of 70+ is considered passing."""),
-            ("human", "Evaluate this Airflow DAG code:\n\n{dag_code}")
-        ])
+A score of 70+ is considered passing."""
+
+JUDGE_MESSAGE = "Evaluate this Airflow DAG code:\n\n{dag_code}"
 
-    def evaluate_dag(self, dag_code: str) -> dict:
+@assets.register_preload
+def _judge_prompt():
+    """Judge prompt template (built once, on first use)."""
+    return assets.prompt_template(("system", JUDGE_SYSTEM_PROMPT), ("human", JUDGE_MESSAGE))
+
+class JudgeAgent:
+    """Scores generated DAGs; the prompt and Gemini models are shared assets built on first use."""
+
+    def evaluate_dag(self, dag_code: str, pipeline_spec: dict = None) -> dict:
         """
         Evaluate the quality of a generated DAG.
         
         Args:
             dag_code (str): The DAG code to evaluate
+            pipeline_spec (dict): Spec the DAG was generated from, used to route the judge model
             
         Returns:
             dict: Evaluation results with score, passed status, and feedback
@@ -60,9 +69,14 @@ A score of 70+ is considered passing."""),
                     "suggestions": ["Fix syntax errors before evaluation"]
                 }
             
-            # Use AI model for detailed evaluation
-            chain = self.judge_prompt | self.model
-            result = chain.invoke({"dag_code": dag_code})
+            # Use AI model for detailed evaluation, on the model tier routed for the spec
+            router = get_router()
+            decision = router.route("judge", pipeline_spec=pipeline_spec) if pipeline_spec is not None else None
+            model_name = decision["model"] if decision else TIER_MODELS["standard"]
+            chain = _judge_prompt() | self._get_model(model_name)
+            
+            with RoutedCall(router, decision) if decision else nullcontext():
+                result = invoke_llm(chain, {"dag_code": dag_code}, agent="judge")
             
             # Parse the JSON response
             response_text = result.content.strip()
@@ -76,6 +90,7 @@ A score of 70+ is considered passing."""),
                 return evaluation
             except json.JSONDecodeError:
                 # Fallback if JSON parsing fails
+                logger.warning("Could not parse judge response", response=response_text)
                 return {
                     "score": 50,
                     "passed": False,
@@ -83,7 +98,11 @@ A score of 70+ is considered passing."""),
                     "suggestions": ["Retry evaluation"]
                 }
                 
+        except (RateLimitError, CircuitOpenError, DeadlineExceededError):
+            # A quota error, open circuit or missed deadline says nothing about the DAG - don't score it as a failure
+            raise
         except Exception as e:
+            logger.error("Judge evaluation failed", error=str(e))
             return {
                 "score": 0,
                 "passed": False,
@@ -91,6 +110,10 @@ A score of 70+ is considered passing."""),
                 "suggestions": ["Check the DAG code for obvious issues"]
             }
 
+    def _get_model(self, model_name: str):
+        """The shared Gemini chat model for a model name."""
+        return assets.chat_model(model_name, TIER_TEMPERATURE)
+
     def _check_syntax(self, code: str) -> bool:
         """Check if the code has valid Python syntax."""
         try:
@@ -1,13 +1,29 @@
 from datetime import datetime
+import ast
 import json
 import os
+import sys
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import ChatPromptTemplate
+
+# Add parent directory to path for shared modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.llm_scheduler import RateLimitError
+from common.resilience import invoke_llm, CircuitOpenError, DeadlineExceededError
+from common.model_router import get_router, RoutedCall
+from common.dag_library import get_library
+from common.structured_logging import get_logger
+from common import assets
+
+logger = get_logger("generator")
 
 # Load environment variables from config.env file
 load_dotenv(os.path.join(os.path.dirname(__file__), 'config.env'))
 
+PROMPT_DIR = os.path.dirname(__file__)
+
+GENERATE_MESSAGE = "Generate an Airflow DAG from this pipeline specification: {pipeline_spec}{examples}"
+
 def save_dag_to_file(dag_code: str, filename: str = None) -> str:
     """
     Save the generated DAG code to a Python file.
@@ -42,9 +58,68 @@ def save_dag_to_file(dag_code: str, filename: str = None) -> str:
     with open(file_path, 'w') as f:
         f.write(dag_code)
     
-    print(f"DAG saved to: {file_path}")
+    logger.info("DAG saved", file_path=file_path)
     return file_path
 
+def _is_valid_python(code: str) -> bool:
+    """Check whether generated code at least parses."""
+    try:
+        ast.parse(code)
+        return True
+    except SyntaxError:
+        return False
+
+def is_incremental(pipeline_spec: dict) -> bool:
+    """
+    Check whether a pipeline specification asks for incremental extraction.
+    
+    Args:
+        pipeline_spec (dict): The pipeline specification JSON
+    
+    Returns:
+        bool: True if the source has a watermark or file_mtime incremental mode
+    """
+    source = pipeline_spec.get("source") or {}
+    incremental = source.get("incremental") if isinstance(source, dict) else None
+    if not isinstance(incremental, dict):
+        return False
+    return str(incremental.get("mode", "")).lower() in ("watermark", "file_mtime")
+
+def build_system_prompt(pipeline_spec: dict) -> str:
+    """
+    Build the system prompt for a pipeline specification.
+    
+    Source-specific rules (paginated API extraction, incremental extraction)
+    are appended to the base system prompt only when the specification needs them.
+    
+    Args:
+        pipeline_spec (dict): The pipeline specification JSON
+    
+    Returns:
+        str: The system prompt template text
+    """
+    system_prompt = assets.prompt_text(os.path.join(PROMPT_DIR, 'system_prompt.txt'))
+    
+    source = pipeline_spec.get("source") or {}
+    if not isinstance(source, dict):
+        return system_prompt
+    
+    if str(source.get("type", "")).upper() == "API":
+        system_prompt += assets.prompt_text(os.path.join(PROMPT_DIR, 'api_extract_prompt.txt'))
+    
+    if is_incremental(pipeline_spec):
+        system_prompt += assets.prompt_text(os.path.join(PROMPT_DIR, 'incremental_prompt.txt'))
+    
+    return system_prompt
+
+@assets.register_preload
+def _preload_assets():
+    # One template per combination of source-specific rules
+    for source_type in ("FILE", "API"):
+        for incremental in (None, {"mode": "file_mtime"}):
+            spec = {"source": {"type": source_type, "incremental": incremental}}
+            assets.prompt_template(("system", build_system_prompt(spec)), ("human", GENERATE_MESSAGE))
+
 def generate_pipeline(pipeline_spec: dict, save_to_file: bool = True) -> str:
     """
     Generate an Airflow DAG from a pipeline specification JSON.
@@ -57,44 +132,55 @@ def generate_pipeline(pipeline_spec: dict, save_to_file: bool = True) -> str:
         str: Complete Airflow DAG Python code ready to run
     """
     try:
-        # Initialize Google Gemini model
-        model = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            temperature=0.1,
-            convert_system_message_to_human=True,
-            google_api_key=os.getenv("GOOGLE_API_KEY")
-        )
-
-        # Read system prompt from file
-        system_prompt_path = os.path.join(os.path.dirname(__file__), 'system_prompt.txt')
-        with open(system_prompt_path, 'r') as f:
-            system_prompt = f.read()
-
-        # Create a simple prompt using the system prompt from file
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("human", "Generate an Airflow DAG from this pipeline specification: {pipeline_spec}")
-        ])
+        library = get_library()
         
-        # Create the chain: prompt | model
-        chain = prompt | model
+        # Reuse an approved DAG for a structurally identical spec without calling the LLM
+        # (not on retries - the judge rejected what the previous attempt produced)
+        if not pipeline_spec.get("feedback"):
+            reused_code = library.reuse(pipeline_spec)
+            if reused_code:
+                if save_to_file:
+                    save_dag_to_file(reused_code)
+                return reused_code
         
-        # Execute the generation
-        result = chain.invoke({"pipeline_spec": json.dumps(pipeline_spec)})
+        # Pick the model tier from spec complexity, confidence, retries and judge history
+        router = get_router()
+        decision = router.route("generator", pipeline_spec=pipeline_spec)
         
-        # Extract the content from the response
-        dag_code = result.content
+        # Google Gemini model for the routed tier (created once per model)
+        model = assets.chat_model(decision["model"], decision["temperature"])
+
+        # Read system prompt from file, plus any source-specific rules
+        system_prompt = build_system_prompt(pipeline_spec)
+
+        # Closest approved DAGs become compact few-shot examples
+        examples = library.few_shot_examples(pipeline_spec)
+        if examples:
+            examples = "\n\nPreviously approved DAGs for similar specifications (follow their structure where it fits):\n\n" + examples
+        
+        # Prompt template for this system prompt (built once per combination of rules)
+        prompt = assets.prompt_template(("system", system_prompt), ("human", GENERATE_MESSAGE))
+        
+        # Create the chain: prompt | model
+        chain = prompt | model
         
-        # Clean up any markdown formatting
-        if dag_code.startswith('```python'):
-            dag_code = dag_code.replace('```python', '').replace('```', '').strip()
-        elif dag_code.startswith('```'):
-            dag_code = dag_code.replace('```', '').strip()
+        # Execute the generation through the shared LLM scheduler and stage guard
+        with RoutedCall(router, decision) as routed_call:
+            result = invoke_llm(chain, {"pipeline_spec": json.dumps(pipeline_spec), "examples": examples}, agent="generator")
+            
+            # Extract the content from the response
+            dag_code = result.content
+            
+            # Clean up any markdown formatting
+            if dag_code.startswith('```python'):
+                dag_code = dag_code.replace('```python', '').replace('```', '').strip()
+            elif dag_code.startswith('```'):
+                dag_code = dag_code.replace('```', '').strip()
+            
+            routed_call.success = _is_valid_python(dag_code)
         
-        print("--------------------------------")
-        print("Generated Airflow DAG:")
-        print(dag_code)
-        print("--------------------------------")
+        # The code itself is logged as a hash and preview, not in full
+        logger.info("Generated Airflow DAG", dag_code=dag_code)
         
         # Save to file if requested
         if save_to_file:
@@ -102,9 +188,19 @@ def generate_pipeline(pipeline_spec: dict, save_to_file: bool = True) -> str:
         
         return dag_code
         
+    except (CircuitOpenError, DeadlineExceededError):
+        # Generator upstream is degraded or too slow - fall back to the closest approved DAG if there is one
+        # (the integration agent never lets such a fallback pass)
+        fallback_code = get_library().reuse(pipeline_spec, degraded=True)
+        if fallback_code:
+            return fallback_code
+        raise
+    except RateLimitError:
+        # Quota exhaustion is not a code problem - let the caller see it
+        raise
     except Exception as e:
         error_msg = f"Error generating pipeline: {str(e)}"
-        print(f"Error: {error_msg}")
+        logger.error("Pipeline generation failed", error=str(e))
         return f"# Error generating pipeline: {error_msg}\n# Original spec: {json.dumps(pipeline_spec, indent=2)}"
 
 
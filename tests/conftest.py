@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the agents and shared modules the way the services do, from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
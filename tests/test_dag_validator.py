@@ -0,0 +1,120 @@
+import pytest
+
+from validation_agent.dag_validator import DAGValidator
+
+HEADER = """
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+
+with DAG("etl") as dag:
+"""
+
+
+def _dag(body):
+    return HEADER + "".join(f"    {line}\n" for line in body.strip().splitlines())
+
+
+def _graph(body):
+    return DAGValidator()._check_task_graph(_dag(body))
+
+
+def test_cycle_is_an_error():
+    errors, _, graph = _graph("""
+a = PythonOperator(task_id="a", python_callable=print)
+b = PythonOperator(task_id="b", python_callable=print)
+c = PythonOperator(task_id="c", python_callable=print)
+a >> b >> c >> a
+""")
+
+    assert graph["cycle"] == ["a", "b", "c"]
+    assert errors == ["Task dependency cycle between: a, b, c - Airflow will refuse to load the DAG"]
+
+
+def test_orphan_task_is_a_warning():
+    errors, warnings, graph = _graph("""
+a = PythonOperator(task_id="a", python_callable=print)
+b = PythonOperator(task_id="b", python_callable=print)
+orphan = PythonOperator(task_id="orphan", python_callable=print)
+a >> b
+""")
+
+    assert errors == []
+    assert graph["isolated"] == ["orphan"]
+    assert any(w.startswith("Tasks not connected to the rest of the DAG: orphan") for w in warnings)
+
+
+@pytest.mark.parametrize("wiring", [
+    "extract >> [clean, enrich] >> load",
+    "load << [clean, enrich] << extract",
+    "clean.set_upstream(extract)\nenrich.set_upstream(extract)\nload.set_upstream([clean, enrich])",
+    "extract.set_downstream([clean, enrich])\nclean.set_downstream(load)\nenrich.set_downstream(load)",
+])
+def test_fan_out_edges(wiring):
+    errors, warnings, graph = _graph(f"""
+extract = PythonOperator(task_id="extract", python_callable=print)
+clean = PythonOperator(task_id="clean", python_callable=print)
+enrich = PythonOperator(task_id="enrich", python_callable=print)
+load = PythonOperator(task_id="load", python_callable=print)
+{wiring}
+""")
+
+    assert errors == [] and warnings == []
+    assert graph["edges"] == 4
+    assert graph["roots"] == ["extract"] and graph["leaves"] == ["load"]
+    assert graph["critical_path"] == ["extract", "clean", "load"]
+    assert graph["max_parallelism"] == 2
+
+
+def test_xcom_pull_is_a_data_edge():
+    code = HEADER.replace("with DAG", '''
+def report(ti):
+    return ti.xcom_pull(task_ids="extract")
+
+with DAG''') + """
+    extract = PythonOperator(task_id="extract", python_callable=print)
+    publish = PythonOperator(task_id="publish", python_callable=report)
+"""
+
+    errors, warnings, graph = DAGValidator()._check_task_graph(code)
+
+    assert errors == [] and warnings == []
+    assert graph["edges"] == 1
+    assert graph["critical_path"] == ["extract", "publish"]
+
+
+def test_templated_xcom_pull_is_a_data_edge():
+    _, _, graph = _graph("""
+extract = PythonOperator(task_id="extract", python_callable=print)
+publish = PythonOperator(task_id="publish", python_callable=print, op_args=["{{ ti.xcom_pull(task_ids='extract') }}"])
+""")
+
+    assert graph["critical_path"] == ["extract", "publish"]
+
+
+def test_independent_transforms_chained_serially_are_flagged():
+    errors, warnings, graph = _graph("""
+extract = PythonOperator(task_id="extract", python_callable=print)
+clean = PythonOperator(task_id="clean", python_callable=print, op_args=[extract.output])
+enrich = PythonOperator(task_id="enrich", python_callable=print, op_args=[extract.output])
+load = PythonOperator(task_id="load", python_callable=print, op_args=[clean.output, enrich.output])
+extract >> clean >> enrich >> load
+""")
+
+    assert errors == []
+    assert graph["critical_path"] == ["extract", "clean", "enrich", "load"]
+    assert warnings == [
+        "Task 'enrich' waits for 'clean' but does not use its output; if they are independent, "
+        "run them in parallel (e.g. extract >> [clean, enrich]) to use more worker slots"
+    ]
+
+
+def test_transforms_that_use_each_others_output_are_not_flagged():
+    _, warnings, _ = _graph("""
+extract = PythonOperator(task_id="extract", python_callable=print)
+clean = PythonOperator(task_id="clean", python_callable=print, op_args=[extract.output])
+enrich = PythonOperator(task_id="enrich", python_callable=print, op_args=[clean.output])
+load = PythonOperator(task_id="load", python_callable=print, op_args=[enrich.output])
+extract >> clean >> enrich >> load
+""")
+
+    assert warnings == []
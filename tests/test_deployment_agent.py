@@ -0,0 +1,57 @@
+from deployment_agent.deployment_agent import DeploymentAgent
+
+
+def _agent(tmp_path):
+    source_dir = tmp_path / "output"
+    target_dir = tmp_path / "dags"
+    source_dir.mkdir()
+    target_dir.mkdir()
+    return DeploymentAgent(source_dir=str(source_dir), target_dir=str(target_dir), registry_dir=str(tmp_path / "registry"))
+
+
+def test_prune_spares_rolled_back_dag(tmp_path):
+    agent = _agent(tmp_path)
+    source_file = agent.source_dir / "x.py"
+
+    source_file.write_text("VERSION = 1\n")
+    agent.sync_dags()
+    source_file.write_text("VERSION = 2\n")
+    agent.sync_dags()
+
+    assert agent.rollback("x")["version"] == 1
+    source_file.unlink()
+    report = agent.sync_dags(prune=True)
+
+    assert report["pruned"] == []
+    assert (agent.target_dir / "x.py").read_text() == "VERSION = 1\n"
+
+
+def test_sync_after_rollback_keeps_restored_version_until_source_changes(tmp_path):
+    agent = _agent(tmp_path)
+    source_file = agent.source_dir / "x.py"
+
+    source_file.write_text("VERSION = 1\n")
+    agent.sync_dags()
+    source_file.write_text("VERSION = 2\n")
+    agent.sync_dags()
+    agent.rollback("x")
+
+    assert agent.sync_dags()["written"] == []
+    assert (agent.target_dir / "x.py").read_text() == "VERSION = 1\n"
+
+    source_file.write_text("VERSION = 3\n")
+    assert agent.sync_dags()["written"] == ["x.py"]
+    source_file.unlink()
+    assert agent.sync_dags(prune=True)["pruned"] == ["x.py"]
+
+
+def test_prune_removes_unchanged_synced_dag(tmp_path):
+    agent = _agent(tmp_path)
+    source_file = agent.source_dir / "x.py"
+
+    source_file.write_text("VERSION = 1\n")
+    agent.sync_dags()
+    source_file.unlink()
+
+    assert agent.sync_dags(prune=True)["pruned"] == ["x.py"]
+    assert not (agent.target_dir / "x.py").exists()
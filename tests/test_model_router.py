@@ -0,0 +1,27 @@
+from common.model_router import ModelRouter
+
+SPEC = {"source": {"type": "csv"}, "destination": {"type": "postgres"}, "transformations": []}
+
+
+def test_judgements_are_written_in_the_background_and_reloaded(tmp_path):
+    log_path = str(tmp_path / "model_routing.jsonl")
+    router = ModelRouter(log_path=log_path)
+    router.record_judgement(SPEC, score=0.4, passed=False)
+    router.record_judgement(SPEC, score=0.9, passed=True)
+
+    assert router.flush()
+    assert router.metrics()["written"] == 2
+    assert ModelRouter(log_path=log_path)._judge_history == router._judge_history
+
+
+def test_log_rotates_and_replay_covers_the_previous_file(tmp_path):
+    log_path = tmp_path / "model_routing.jsonl"
+    router = ModelRouter(log_path=str(log_path), max_bytes=1000)
+    for _ in range(20):
+        router.record_judgement(SPEC, score=0.9, passed=True)
+        router.flush()
+
+    assert (tmp_path / "model_routing.jsonl.1").exists()
+    assert log_path.stat().st_size <= 1000
+    judged, failed = next(iter(ModelRouter(log_path=str(log_path))._judge_history.values()))
+    assert 0 < judged < 20 and failed == 0
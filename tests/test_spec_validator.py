@@ -0,0 +1,134 @@
+import copy
+
+import pytest
+
+from parser_agent.spec_validator import SPEC_FIELDS, validate_spec
+
+VALID_SPEC = {
+    "user_request": "Load orders.csv into the orders table",
+    "source": {"type": "csv", "endpoint_or_table": "orders.csv", "query_or_filter": None},
+    "destination": {"type": "postgres", "path": "orders"},
+    "transformations": [{"step_number": 1, "operation": "drop duplicate rows", "language": "python", "target": None}],
+    "confidence": 0.9,
+}
+
+
+def _spec(**overrides):
+    spec = copy.deepcopy(VALID_SPEC)
+    for dotted, value in overrides.items():
+        *parents, key = dotted.split("__")
+        node = spec
+        for parent in parents:
+            node = node[parent]
+        if value is KeyError:
+            node.pop(key)
+        else:
+            node[key] = value
+    return spec
+
+
+def test_valid_spec_passes_unchanged():
+    result = validate_spec(copy.deepcopy(VALID_SPEC))
+
+    assert result == {"valid": True, "spec": VALID_SPEC, "errors": [], "fields": [], "repairs": []}
+
+
+@pytest.mark.parametrize("spec, repair, field, expected", [
+    (_spec(source__query_or_filter="null"),
+     "source.query_or_filter: 'null' -> null", "source", {**VALID_SPEC["source"], "query_or_filter": None}),
+    (_spec(source__query_or_filter=" N/A "),
+     "source.query_or_filter: ' N/A ' -> null", "source", {**VALID_SPEC["source"], "query_or_filter": None}),
+    (_spec(transformations={"operation": "drop duplicate rows"}),
+     "transformations: single step wrapped in a list", "transformations", VALID_SPEC["transformations"]),
+    (_spec(transformations="drop duplicate rows"),
+     "transformations: description string wrapped in a list", "transformations", VALID_SPEC["transformations"]),
+    (_spec(transformations="null"),
+     "transformations: 'null' -> []", "transformations", []),
+    (_spec(destination__path=KeyError, destination__table="orders"),
+     "destination.path: taken from destination.table", "destination",
+     {"type": "postgres", "path": "orders", "table": "orders"}),
+    (_spec(destination__path="none", destination__target="orders"),
+     "destination.path: taken from destination.target", "destination",
+     {"type": "postgres", "path": "orders", "target": "orders"}),
+    (_spec(user_request=KeyError),
+     "user_request: filled from the original request", "user_request", "Load orders.csv into the orders table"),
+    (_spec(confidence=85),
+     "confidence: percentage scaled to 0-1", "confidence", 0.85),
+])
+def test_repairs(spec, repair, field, expected):
+    result = validate_spec(spec, request=" Load orders.csv into the orders table ")
+
+    assert result["valid"], result["errors"]
+    assert repair in result["repairs"]
+    assert result["spec"][field] == expected
+
+
+@pytest.mark.parametrize("spec, errors, fields", [
+    (_spec(user_request=KeyError), ["user_request: missing"], ["user_request"]),
+    (_spec(source__type="null"), ["source.type: missing"], ["source"]),
+    (_spec(source__endpoint_or_table=""), ["source.endpoint_or_table: missing"], ["source"]),
+    (_spec(destination__type=None), ["destination.type: missing"], ["destination"]),
+    (_spec(destination__path=KeyError), ["destination.path: missing"], ["destination"]),
+    (_spec(transformations=42), ["transformations: expected a list, got int"], ["transformations"]),
+    (_spec(transformations=[7]), ["transformations[1]: expected an object, got int"], ["transformations"]),
+    (_spec(transformations=[{"operation": "null"}]), ["transformations[1].operation: missing"], ["transformations"]),
+    (_spec(source__type=None, destination__path=None),
+     ["source.type: missing", "destination.path: missing"], ["destination", "source"]),
+])
+def test_errors(spec, errors, fields):
+    result = validate_spec(spec)
+
+    assert not result["valid"]
+    assert result["errors"] == errors
+    assert result["fields"] == fields
+
+
+@pytest.mark.parametrize("spec, type_name", [
+    (None, "NoneType"),
+    ("not json", "str"),
+    ([VALID_SPEC], "list"),
+])
+def test_non_object_spec_needs_a_full_reparse(spec, type_name):
+    result = validate_spec(spec)
+
+    assert result == {
+        "valid": False,
+        "spec": spec,
+        "errors": [f"spec: expected a JSON object, got {type_name}"],
+        "fields": list(SPEC_FIELDS),
+        "repairs": [],
+    }
+
+
+@pytest.mark.parametrize("field, value, error", [
+    ("source", None, "source: expected an object with type, endpoint_or_table and query_or_filter"),
+    ("source", "orders.csv", "source: expected an object with type, endpoint_or_table and query_or_filter"),
+    ("source", ["csv"], "source: expected an object with type, endpoint_or_table and query_or_filter"),
+    ("destination", None, "destination: expected an object with type and path"),
+    ("destination", "orders", "destination: expected an object with type and path"),
+    ("destination", 3, "destination: expected an object with type and path"),
+])
+def test_non_object_source_or_destination(field, value, error):
+    result = validate_spec(_spec(**{field: value}))
+
+    assert result["errors"] == [error]
+    assert result["fields"] == [field]
+    assert result["spec"][field] == value
+
+
+def test_json_strings_are_decoded():
+    spec = _spec(source='```json\n{"type": "csv", "endpoint_or_table": "orders.csv"}\n```')
+
+    result = validate_spec(spec)
+
+    assert result["valid"]
+    assert result["spec"]["source"] == VALID_SPEC["source"]
+
+
+def test_input_is_not_modified():
+    spec = _spec(source__query_or_filter="null", transformations="drop duplicate rows")
+    original = copy.deepcopy(spec)
+
+    validate_spec(spec)
+
+    assert spec == original
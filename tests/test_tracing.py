@@ -0,0 +1,44 @@
+from common.tracing import TraceStore
+
+
+def _spans(trace_id):
+    return [
+        {"trace_id": trace_id, "span_id": "root", "parent_id": None, "name": "flow"},
+        {"trace_id": trace_id, "span_id": "child", "parent_id": "root", "name": "parse"},
+    ]
+
+
+def test_spans_are_written_by_the_background_writer(tmp_path):
+    store = TraceStore(str(tmp_path / "traces.jsonl"))
+    for span_dict in _spans("t1"):
+        store.append(span_dict)
+
+    assert store.flush()
+    assert [span["name"] for span in store.get_trace("t1")] == ["flow", "parse"]
+    assert store.metrics()["written"] == 2
+
+
+def test_index_keeps_only_the_last_traces(tmp_path):
+    store = TraceStore(str(tmp_path / "traces.jsonl"), max_traces=3)
+    for i in range(10):
+        for span_dict in _spans(f"t{i}"):
+            store.append(span_dict)
+
+    assert [span["trace_id"] for span in store.recent_traces(limit=20)] == ["t9", "t8", "t7"]
+    assert store.get_trace("t0") == []
+    assert len(store.get_trace("t9")) == 2
+    assert store.metrics()["indexed_traces"] == 3
+
+
+def test_store_rotates_past_max_bytes(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    store = TraceStore(str(path), max_bytes=1000)
+    for i in range(20):
+        for span_dict in _spans(f"t{i}"):
+            store.append(span_dict)
+        store.flush()
+    store.append(_spans("latest")[0])
+
+    assert (tmp_path / "traces.jsonl.1").exists()
+    assert path.stat().st_size <= 1000
+    assert [span["trace_id"] for span in store.recent_traces(limit=1)] == ["latest"]
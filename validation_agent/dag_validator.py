@@ -1,6 +1,43 @@
 import ast
+import importlib.util
 import os
-from typing import Dict, List, Tuple
+import re
+import subprocess
+import sys
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+
+# Modules that are slow to import and belong inside task callables
+HEAVY_MODULES = {
+    'pandas', 'numpy', 'psycopg2', 'sqlalchemy', 'requests', 'boto3', 'pyarrow',
+    'sklearn', 'scipy', 'tensorflow', 'torch', 'pyspark', 'matplotlib', 'google.cloud',
+}
+
+# Calls that do I/O when evaluated at module scope (matched on the dotted call name)
+EXPENSIVE_CALLS = {
+    'open', 'urlopen', 'urllib.request.urlopen', 'time.sleep', 'psycopg2.connect',
+    'create_engine', 'sqlalchemy.create_engine', 'os.listdir', 'os.walk', 'glob.glob',
+    'BaseHook.get_connection',
+}
+EXPENSIVE_CALL_PREFIXES = ('requests.', 'subprocess.', 'pd.read_', 'pandas.read_', 'boto3.')
+
+# Calls that are slower than they look at module scope but not fatal
+SLOW_CALLS = {'Variable.get', 'models.Variable.get'}
+
+# Helpers from airflow.models.baseoperator that wire dependencies
+CHAIN_FUNCTIONS = {'chain', 'chain_linear', 'cross_downstream'}
+
+# `xcom_pull(task_ids='...')` in a templated operator argument
+XCOM_TEMPLATE_PATTERN = re.compile(r"xcom_pull\(\s*(?:task_ids\s*=\s*)?['\"]([^'\"]+)['\"]")
+
+# Measures how long a DAG file takes to import, run in a fresh interpreter
+IMPORT_TIMER_SCRIPT = (
+    "import runpy, sys, time\n"
+    "start = time.perf_counter()\n"
+    "runpy.run_path(sys.argv[1], run_name='dag_parse_check')\n"
+    "print(time.perf_counter() - start)\n"
+)
 
 
 class DAGValidator:
@@ -9,12 +46,33 @@ class DAGValidator:
     Performs both Python syntax validation and Airflow-specific validation.
     """
     
-    def __init__(self):
-        self.pipeline_output_dir = os.path.join(
+    def __init__(self, parse_time_budget: Optional[float] = None, measure_import_time: Optional[bool] = None,
+                 pipeline_output_dir: Optional[str] = None):
+        """
+        Initialize the validator.
+        
+        Args:
+            parse_time_budget (float): Max seconds a DAG file may take to import
+                (defaults to DAG_PARSE_TIME_BUDGET or 2.0); only enforced when
+                import time is measured
+            measure_import_time (bool): Import each DAG in a subprocess and enforce the budget
+                (defaults to off; on when DAG_MEASURE_IMPORT_TIME=1)
+            pipeline_output_dir (str): Directory DAG filenames are resolved against
+                (defaults to pipeline_generator_agent/output)
+        """
+        self.pipeline_output_dir = pipeline_output_dir or os.path.join(
             os.path.dirname(os.path.dirname(__file__)), 
             'pipeline_generator_agent', 
             'output'
         )
+        
+        if parse_time_budget is None:
+            parse_time_budget = float(os.getenv('DAG_PARSE_TIME_BUDGET', '2.0'))
+        if measure_import_time is None:
+            measure_import_time = os.getenv('DAG_MEASURE_IMPORT_TIME', '0') == '1'
+        
+        self.parse_time_budget = parse_time_budget
+        self.measure_import_time = measure_import_time
     
     def validate_dag(self, filename: str) -> Dict:
         """
@@ -25,6 +83,8 @@ class DAGValidator:
             
         Returns:
             Dict: Validation results with success, errors, warnings, and file_path
+                (plus parse_time, or parse_time_skipped with the reason when the
+                import time could not be measured)
         """
         file_path = os.path.join(self.pipeline_output_dir, filename)
         
@@ -61,6 +121,40 @@ class DAGValidator:
             
             result['warnings'].extend(airflow_warnings)
             
+            # Rebuild the task graph and check its shape
+            if syntax_valid:
+                graph_errors, graph_warnings, task_graph = self._check_task_graph(code)
+                result['task_graph'] = task_graph
+                if graph_errors:
+                    result['success'] = False
+                    result['errors'].extend(graph_errors)
+                
+                result['warnings'].extend(graph_warnings)
+            
+            # Perform parse-time (top-level code) validation
+            top_level_errors, top_level_warnings = self._check_top_level_code(code)
+            if top_level_errors:
+                result['success'] = False
+                result['errors'].extend(top_level_errors)
+            
+            result['warnings'].extend(top_level_warnings)
+            
+            # Optionally measure the real import time against the budget
+            if not self.measure_import_time:
+                result['parse_time_skipped'] = (
+                    "Parse-time budget not checked: import-time measurement is off (set DAG_MEASURE_IMPORT_TIME=1)"
+                )
+            elif syntax_valid:
+                parse_time, budget_errors, budget_warnings = self._check_parse_time_budget(file_path)
+                result['parse_time'] = parse_time
+                if parse_time is None and not budget_errors:
+                    result['parse_time_skipped'] = budget_warnings[-1]
+                if budget_errors:
+                    result['success'] = False
+                    result['errors'].extend(budget_errors)
+                
+                result['warnings'].extend(budget_warnings)
+            
         except Exception as e:
             result['success'] = False
             result['errors'].append(f"Unexpected error during validation: {str(e)}")
@@ -173,18 +267,436 @@ class DAGValidator:
         elif task_count == 1:
             warnings.append("Only one task found - consider if this is intentional")
         
-        # Check for task dependencies (>> operator usage)
-        has_dependencies = False
-        for node in ast.walk(tree):
-            if isinstance(node, ast.RShift):  # >> operator
-                has_dependencies = True
-                break
-        
-        if task_count > 1 and not has_dependencies:
-            warnings.append("Multiple tasks found but no task dependencies (>>) detected")
+        # Task dependencies are checked on the rebuilt graph in _check_task_graph
         
         # Additional checks
         if dag_id and len(dag_id) > 250:
             warnings.append(f"DAG ID '{dag_id}' is longer than 250 characters")
         
         return errors, warnings
+    
+    def _check_task_graph(self, code: str) -> Tuple[List[str], List[str], Dict]:
+        """
+        Rebuild the task dependency graph and check it for cycles, orphans and needless serialization.
+        
+        Tasks are module-scope assignments of operator (or @task function) calls.
+        Edges come from `>>`/`<<` chains (including lists, and as the value of an
+        assignment), set_upstream/set_downstream, chain()/cross_downstream() and
+        data passed between tasks (`task.output`, TaskFlow call arguments, and
+        `xcom_pull(task_ids=...)` in a task's callable or templated arguments).
+        Extraction and analysis are linear in the size of the file and the graph.
+        
+        Args:
+            code (str): Python code to validate
+            
+        Returns:
+            Tuple[List[str], List[str], Dict]: (errors, warnings, graph summary with
+                tasks, edges, critical path and max parallelism)
+        """
+        errors = []
+        warnings = []
+        
+        tree = ast.parse(code)
+        statements = list(self._module_scope_statements(tree.body))
+        
+        # Pass 1: task variables (variable name -> task_id) and @task functions
+        taskflow_functions = {
+            node.name for node in tree.body
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+            and any((self._dotted_name(d.func if isinstance(d, ast.Call) else d) or '').split('.')[0] == 'task'
+                    for d in node.decorator_list)
+        }
+        tasks = {}
+        task_calls = {}
+        for node in statements:
+            if isinstance(node, (ast.Assign, ast.AnnAssign)) and isinstance(node.value, ast.Call):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                call = node.value
+                call_name = self._dotted_name(call.func) or ''
+                base_name = call_name.split('.')[-1]
+                if not (base_name.endswith(('Operator', 'Sensor')) or base_name in taskflow_functions):
+                    continue
+                for target in targets:
+                    if isinstance(target, ast.Name):
+                        tasks[target.id] = self._task_id(call, default=base_name if base_name in taskflow_functions else target.id)
+                        task_calls[target.id] = call
+        
+        # XCom pulls in module-level functions (python_callables and @task bodies): function -> task_ids
+        xcom_pulls = {
+            node.name: self._xcom_pulled_task_ids(node)
+            for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+        }
+        task_variables = {}
+        for name, task_id in tasks.items():
+            task_variables.setdefault(task_id, []).append(name)
+        
+        # Pass 2: dependency edges (upstream, downstream) and data edges
+        edges: Set[Tuple[str, str]] = set()
+        data_inputs = {name: set() for name in tasks}
+        
+        for name, call in task_calls.items():
+            upstreams = self._referenced_tasks(call, tasks)
+            for task_id in self._pulled_task_ids(call, xcom_pulls):
+                upstreams.update(task_variables.get(task_id, ()))
+            for upstream in upstreams:
+                if upstream != name:
+                    data_inputs[name].add(upstream)
+                    edges.add((upstream, name))
+        
+        for statement in statements:
+            if isinstance(statement, ast.Expr):
+                node = statement.value
+            elif isinstance(statement, ast.AugAssign) and isinstance(statement.op, (ast.RShift, ast.LShift)):
+                # `a >>= b` wires a >> b
+                node = ast.BinOp(left=statement.target, op=statement.op, right=statement.value)
+            elif isinstance(statement, (ast.Assign, ast.AnnAssign)) and statement.value is not None:
+                # `x = a >> b` wires a >> b too
+                node = statement.value
+            else:
+                continue
+            if isinstance(node, ast.BinOp):
+                self._shift_chain(node, tasks, edges)
+            elif isinstance(node, ast.Call):
+                call_name = self._dotted_name(node.func) or ''
+                base_name = call_name.split('.')[-1]
+                if base_name in ('set_upstream', 'set_downstream') and isinstance(node.func, ast.Attribute):
+                    owner = self._task_refs(node.func.value, tasks)
+                    others = [t for arg in node.args for t in self._task_refs(arg, tasks)]
+                    pairs = [(o, t) for t in owner for o in others] if base_name == 'set_upstream' \
+                        else [(t, o) for t in owner for o in others]
+                    edges.update(pairs)
+                elif base_name in CHAIN_FUNCTIONS:
+                    groups = [self._task_refs(arg, tasks) for arg in node.args]
+                    for upstream, downstream in zip(groups, groups[1:]):
+                        if base_name == 'chain' and len(upstream) == len(downstream) > 1:
+                            edges.update(zip(upstream, downstream))
+                        else:
+                            edges.update((u, d) for u in upstream for d in downstream)
+        
+        graph = self._analyze_task_graph(tasks, edges)
+        
+        if graph['cycle']:
+            errors.append(
+                f"Task dependency cycle between: {', '.join(graph['cycle'])} - Airflow will refuse to load the DAG"
+            )
+        
+        if len(tasks) > 1 and not edges:
+            warnings.append("Multiple tasks found but no task dependencies detected")
+        elif graph['isolated']:
+            warnings.append(
+                f"Tasks not connected to the rest of the DAG: {', '.join(graph['isolated'])} - "
+                f"they run with no ordering guarantee"
+            )
+        
+        # Independent transforms chained serially: b runs after a but never uses a's data.
+        # Transforms are tasks that both consume and produce task data; ordering edges
+        # to or from setup, extract and load tasks (e.g. create_table >> load) are intended.
+        consumed = {upstream for inputs in data_inputs.values() for upstream in inputs}
+        transforms = {name for name in tasks if data_inputs[name] and name in consumed}
+        if transforms and not graph['cycle']:
+            for upstream, downstream in sorted(edges):
+                if (upstream in transforms and downstream in transforms
+                        and not self._is_data_ancestor(upstream, downstream, data_inputs)):
+                    sources = ', '.join(sorted(tasks[name] for name in data_inputs[downstream]))
+                    warnings.append(
+                        f"Task '{tasks[downstream]}' waits for '{tasks[upstream]}' but does not use its output; "
+                        f"if they are independent, run them in parallel "
+                        f"(e.g. {sources} >> [{tasks[upstream]}, {tasks[downstream]}]) to use more worker slots"
+                    )
+        
+        return errors, warnings, graph
+    
+    def _analyze_task_graph(self, tasks: Dict[str, str], edges: Set[Tuple[str, str]]) -> Dict:
+        """Topological sort (Kahn), cycle detection, critical path and widest level of the task graph."""
+        downstream = {name: [] for name in tasks}
+        in_degree = {name: 0 for name in tasks}
+        for upstream, child in sorted(edges):
+            downstream[upstream].append(child)
+            in_degree[child] += 1
+        
+        roots = [name for name in tasks if in_degree[name] == 0]
+        queue = deque(roots)
+        remaining = dict(in_degree)
+        # Longest path (in tasks) ending at each task, and the predecessor on it
+        depth = {name: 1 for name in tasks}
+        previous = {}
+        order = []
+        while queue:
+            name = queue.popleft()
+            order.append(name)
+            for child in downstream[name]:
+                if depth[name] + 1 > depth[child]:
+                    depth[child] = depth[name] + 1
+                    previous[child] = name
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    queue.append(child)
+        
+        cycle = self._cycle_members([name for name in tasks if remaining[name] > 0], edges, tasks)
+        
+        critical_path = []
+        if order and not cycle:
+            node = max(order, key=lambda name: depth[name])
+            while node is not None:
+                critical_path.append(tasks[node])
+                node = previous.get(node)
+            critical_path.reverse()
+        
+        # Tasks at the same depth never depend on each other, so the widest level can run at once
+        level_sizes = {}
+        for name in order:
+            level_sizes[depth[name]] = level_sizes.get(depth[name], 0) + 1
+        
+        connected = {name for edge in edges for name in edge}
+        return {
+            'tasks': len(tasks),
+            'edges': len(edges),
+            'roots': [tasks[name] for name in roots],
+            'leaves': [tasks[name] for name in tasks if not downstream[name]],
+            'isolated': sorted(tasks[name] for name in tasks if name not in connected) if edges else [],
+            'cycle': cycle,
+            'critical_path': critical_path,
+            'critical_path_length': len(critical_path),
+            'max_parallelism': max(level_sizes.values()) if level_sizes else 0,
+        }
+    
+    def _module_scope_statements(self, body: List[ast.stmt]):
+        """Yield module-scope statements, descending into with/if/for/try blocks but not functions or classes."""
+        for statement in body:
+            if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                continue
+            yield statement
+            for field in ('body', 'orelse', 'finalbody'):
+                yield from self._module_scope_statements(getattr(statement, field, []))
+            for handler in getattr(statement, 'handlers', []):
+                yield from self._module_scope_statements(handler.body)
+    
+    def _cycle_members(self, unsorted: List[str], edges: Set[Tuple[str, str]], tasks: Dict[str, str]) -> List[str]:
+        """Task ids on a cycle: tasks Kahn's sort could not order, minus those merely downstream of a cycle."""
+        members = set(unsorted)
+        upstream_of = {name: [] for name in members}
+        out_degree = dict.fromkeys(members, 0)
+        for upstream, child in edges:
+            if upstream in members and child in members:
+                upstream_of[child].append(upstream)
+                out_degree[upstream] += 1
+        # Peel tasks with no successors left; what remains lies on (or between) cycles
+        queue = deque(name for name in members if out_degree[name] == 0)
+        while queue:
+            name = queue.popleft()
+            members.discard(name)
+            for upstream in upstream_of[name]:
+                out_degree[upstream] -= 1
+                if out_degree[upstream] == 0:
+                    queue.append(upstream)
+        return sorted(tasks[name] for name in members)
+    
+    def _shift_chain(self, node: ast.AST, tasks: Dict[str, str], edges: Set[Tuple[str, str]]) -> List[str]:
+        """Add the edges of an `a >> [b, c] << d` expression; returns the tasks the expression evaluates to."""
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.RShift, ast.LShift)):
+            left = self._shift_chain(node.left, tasks, edges)
+            right = self._shift_chain(node.right, tasks, edges)
+            if isinstance(node.op, ast.RShift):
+                edges.update((l, r) for l in left for r in right)
+            else:
+                edges.update((r, l) for l in left for r in right)
+            # Like Airflow, `a >> b` evaluates to b
+            return right
+        return self._task_refs(node, tasks)
+    
+    def _task_refs(self, node: ast.AST, tasks: Dict[str, str]) -> List[str]:
+        """Task variables named by an expression: a task, a list/tuple of tasks, or `task.output`."""
+        if isinstance(node, ast.Name):
+            return [node.id] if node.id in tasks else []
+        if isinstance(node, ast.Attribute) and node.attr == 'output':
+            return self._task_refs(node.value, tasks)
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            return [name for element in node.elts for name in self._task_refs(element, tasks)]
+        if isinstance(node, ast.Starred):
+            return self._task_refs(node.value, tasks)
+        return []
+    
+    def _referenced_tasks(self, call: ast.Call, tasks: Dict[str, str]) -> Set[str]:
+        """Tasks whose data a task call consumes: `task.output` anywhere in its arguments, or a TaskFlow result."""
+        referenced = set()
+        for arg in list(call.args) + [keyword.value for keyword in call.keywords]:
+            for node in ast.walk(arg):
+                if isinstance(node, ast.Attribute) and node.attr == 'output' and isinstance(node.value, ast.Name):
+                    if node.value.id in tasks:
+                        referenced.add(node.value.id)
+                elif isinstance(node, ast.Name) and node.id in tasks and isinstance(arg, (ast.Name, ast.List, ast.Tuple)):
+                    referenced.add(node.id)
+        return referenced
+    
+    def _xcom_pulled_task_ids(self, function: ast.AST) -> Set[str]:
+        """Literal task_ids passed to `xcom_pull(...)` anywhere in a function."""
+        pulled = set()
+        for node in ast.walk(function):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'xcom_pull'):
+                continue
+            task_ids = next((keyword.value for keyword in node.keywords if keyword.arg == 'task_ids'),
+                            node.args[0] if node.args else None)
+            values = task_ids.elts if isinstance(task_ids, (ast.List, ast.Tuple, ast.Set)) else [task_ids]
+            pulled.update(value.value for value in values
+                          if isinstance(value, ast.Constant) and isinstance(value.value, str))
+        return pulled
+    
+    def _pulled_task_ids(self, call: ast.Call, xcom_pulls: Dict[str, Set[str]]) -> Set[str]:
+        """task_ids a task call pulls over XCom: in its python_callable, its @task body or templated arguments."""
+        pulled = set(xcom_pulls.get(self._dotted_name(call.func) or '', ()))
+        for keyword in call.keywords:
+            if keyword.arg == 'python_callable' and isinstance(keyword.value, ast.Name):
+                pulled.update(xcom_pulls.get(keyword.value.id, ()))
+        for arg in list(call.args) + [keyword.value for keyword in call.keywords]:
+            for node in ast.walk(arg):
+                if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                    pulled.update(XCOM_TEMPLATE_PATTERN.findall(node.value))
+        return pulled
+    
+    def _is_data_ancestor(self, upstream: str, task: str, data_inputs: Dict[str, Set[str]]) -> bool:
+        """Whether `task` consumes `upstream`'s data directly or through other tasks."""
+        seen = set()
+        stack = list(data_inputs[task])
+        while stack:
+            name = stack.pop()
+            if name == upstream:
+                return True
+            if name not in seen:
+                seen.add(name)
+                stack.extend(data_inputs.get(name, ()))
+        return False
+    
+    def _task_id(self, call: ast.Call, default: str) -> str:
+        """The task_id keyword of an operator call if it is a literal, else `default`."""
+        for keyword in call.keywords:
+            if keyword.arg == 'task_id' and isinstance(keyword.value, ast.Constant):
+                return str(keyword.value.value)
+        return default
+    
+    def _check_top_level_code(self, code: str) -> Tuple[List[str], List[str]]:
+        """
+        Find expensive statements that run every time the scheduler parses the file.
+        
+        Module-scope code is inspected, including `with DAG(...)` blocks and
+        class bodies (which also run at import time); function and lambda
+        bodies run at task time and are skipped.
+        
+        Args:
+            code (str): Python code to validate
+            
+        Returns:
+            Tuple[List[str], List[str]]: (errors, warnings)
+        """
+        errors = []
+        warnings = []
+        
+        try:
+            tree = ast.parse(code)
+        except:
+            return errors, warnings
+        
+        for node in self._module_scope_nodes(tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    if self._is_heavy_module(alias.name):
+                        warnings.append(
+                            f"Top-level import of '{alias.name}' at line {node.lineno} slows DAG parsing; "
+                            f"import it inside the task callable"
+                        )
+            elif isinstance(node, ast.ImportFrom):
+                if node.module and self._is_heavy_module(node.module):
+                    warnings.append(
+                        f"Top-level import from '{node.module}' at line {node.lineno} slows DAG parsing; "
+                        f"import it inside the task callable"
+                    )
+            elif isinstance(node, ast.Call):
+                call_name = self._dotted_name(node.func)
+                if not call_name:
+                    continue
+                if call_name in EXPENSIVE_CALLS or call_name.startswith(EXPENSIVE_CALL_PREFIXES):
+                    errors.append(
+                        f"Module-level call '{call_name}()' at line {node.lineno} runs on every DAG parse; "
+                        f"move it inside a task callable"
+                    )
+                elif call_name in SLOW_CALLS:
+                    warnings.append(
+                        f"Module-level call '{call_name}()' at line {node.lineno} queries the metadata database "
+                        f"on every DAG parse; use a template or read it inside the task"
+                    )
+        
+        return errors, warnings
+    
+    def _check_parse_time_budget(self, file_path: str) -> Tuple[Optional[float], List[str], List[str]]:
+        """
+        Import the DAG file in a fresh interpreter and compare its import time to the budget.
+        
+        Skipped with a warning (parse_time None) when airflow is not installed here,
+        since the DAG file cannot be imported without it.
+        
+        Args:
+            file_path (str): Path of the DAG file
+            
+        Returns:
+            Tuple[Optional[float], List[str], List[str]]: (parse_time, errors, warnings)
+        """
+        errors = []
+        warnings = []
+        
+        if importlib.util.find_spec('airflow') is None:
+            warnings.append("Parse-time budget not checked: airflow is not installed in the validator's environment")
+            return None, errors, warnings
+        
+        try:
+            completed = subprocess.run(
+                [sys.executable, '-c', IMPORT_TIMER_SCRIPT, file_path],
+                capture_output=True,
+                text=True,
+                timeout=max(self.parse_time_budget * 10, 30),
+            )
+        except subprocess.TimeoutExpired:
+            errors.append(f"DAG import timed out (budget {self.parse_time_budget:.2f}s)")
+            return None, errors, warnings
+        
+        if completed.returncode != 0:
+            last_line = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'unknown error'
+            warnings.append(f"Parse-time budget not checked: could not import the DAG ({last_line})")
+            return None, errors, warnings
+        
+        parse_time = float(completed.stdout.strip().splitlines()[-1])
+        if parse_time > self.parse_time_budget:
+            errors.append(
+                f"DAG import took {parse_time:.2f}s, over the parse-time budget of {self.parse_time_budget:.2f}s"
+            )
+        
+        return parse_time, errors, warnings
+    
+    def _module_scope_nodes(self, node: ast.AST):
+        """Yield every node evaluated at import time, skipping function and lambda bodies."""
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+                # Decorators and default values still run at import time
+                extra = list(getattr(child, 'decorator_list', []))
+                extra.extend(child.args.defaults)
+                extra.extend(d for d in child.args.kw_defaults if d is not None)
+                for expr in extra:
+                    yield expr
+                    yield from self._module_scope_nodes(expr)
+                continue
+            yield child
+            yield from self._module_scope_nodes(child)
+    
+    def _is_heavy_module(self, module_name: str) -> bool:
+        """Check whether a module (or one of its parents) is in HEAVY_MODULES."""
+        parts = module_name.split('.')
+        return any('.'.join(parts[:i]) in HEAVY_MODULES for i in range(1, len(parts) + 1))
+    
+    def _dotted_name(self, node: ast.AST) -> Optional[str]:
+        """Return the dotted name of a call target such as 'requests.get', or None."""
+        parts = []
+        while isinstance(node, ast.Attribute):
+            parts.append(node.attr)
+            node = node.value
+        if isinstance(node, ast.Name):
+            parts.append(node.id)
+            return '.'.join(reversed(parts))
+        return None